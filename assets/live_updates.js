@@ -0,0 +1,95 @@
+// Receives the server-sent update events and hands them to the Dash callbacks through the clientside ones below.
+(function () {
+    let pending = null;
+    let sequence = 0;
+
+    // relative to the page, so it works behind a reverse proxy prefix too
+    const source = new EventSource('api/updates');
+    source.addEventListener('update', function (event) {
+        const update = JSON.parse(event.data);
+        if (pending !== null) {
+            // updates that arrived since the last poll are merged, so no points are lost
+            if (pending.points === null || update.points === null) {
+                update.full = true;
+                update.points = null;
+            } else {
+                for (const column of Object.keys(update.points)) {
+                    update.points[column] = pending.points[column].concat(update.points[column]);
+                }
+            }
+            update.first_time = pending.first_time || update.first_time;
+        }
+        pending = update;
+    });
+
+    // the selected range of the timeline like get_timeframe in dashboard.py, null if nothing is selected
+    function getTimeframe(relayout) {
+        if (!relayout) {
+            return null;
+        }
+        if (relayout['xaxis.range'] !== undefined) {
+            return relayout['xaxis.range'];
+        }
+        if (relayout['xaxis.range[0]'] !== undefined) {
+            return [relayout['xaxis.range[0]'], relayout['xaxis.range[1]']];
+        }
+        return null;
+    }
+
+    // the times of the updates have an offset, the range is in the same timezone without one
+    function toRangeTime(time) {
+        return time.replace('T', ' ').replace(/(Z|[+-]\d\d:\d\d)$/, '');
+    }
+
+    // whether the update adds rows to the selected range, both times are 'YYYY-MM-DD hh:mm:ss...' and sort as text
+    function addsToRange(update, relayout) {
+        if (update.first_time === null) {
+            return false;
+        }
+        const timeframe = getTimeframe(relayout);
+        if (timeframe === null) {
+            return true;
+        }
+        const end = timeframe.map(String).sort()[1];
+        return end >= toRangeTime(update.first_time);
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        live: {
+            // runs in the browser every second, the server only sees a request when there was an update, and only
+            // from the callbacks whose figures it changes: live-refresh is only set for updates that add rows to the
+            // selected range, live-reload only for those of them that are too big to extend the timeline with
+            takeUpdate: function (_n_intervals, relayout) {
+                const no_update = window.dash_clientside.no_update;
+                if (pending === null) {
+                    return [no_update, no_update, no_update];
+                }
+                const update = Object.assign({sequence: sequence++}, pending);
+                pending = null;
+                const refresh = addsToRange(update, relayout);
+                return [update, refresh ? update : no_update, refresh && update.full ? update : no_update];
+            },
+            extendTimeline: function (update, figure) {
+                if (!update || update.full || update.points === null || update.points.time.length === 0 || !figure) {
+                    return window.dash_clientside.no_update;
+                }
+                const points = update.points;
+                const customdata = points.time.map((_, i) => [points.layer[i], points.source[i]]);
+                const extension = {x: [], y: [], customdata: []};
+                const indices = [];
+                figure.data.forEach(function (trace, index) {
+                    // the trace names of update_timeline: 'Player count' and 'Change in <n> mins'
+                    const column = trace.name === 'Player count' ? 'player_count'
+                        : 'player_change_' + trace.name.split(' ')[2] + '_mins';
+                    if (points[column] !== undefined) {
+                        extension.x.push(points.time);
+                        extension.y.push(points[column]);
+                        extension.customdata.push(customdata);
+                        indices.push(index);
+                    }
+                });
+                return [extension, indices];
+            }
+        }
+    });
+})();
@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import argparse
+import filecmp
+import logging
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import metrics
+import process
+import raw_log
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+CHUNK_DAYS = 7
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Reprocess the whole raw log in parallel chunks of days')
+    parser.add_argument('--log_folder', type=str, help='Folder of the raw query log', default='./data')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Number of worker processes')
+    parser.add_argument('--chunk_days', type=int, default=CHUNK_DAYS, help='Days of raw log per chunk')
+    parser.add_argument('--player_change_windows', type=int, nargs='+', help='Player change windows in minutes',
+                        default=list(process.PLAYER_CHANGE_WINDOWS))
+    parser.add_argument('--output_formats', type=str, nargs='+', choices=['arrow', 'csv'],
+                        help='Formats to write the processed tables in, arrow is always written',
+                        default=list(process.OUTPUT_FORMATS))
+    parser.add_argument('--verify', action='store_true',
+                        help='Backfill and run the serial processing into temporary folders and compare the outputs, '
+                             'without touching the outputs of the log folder')
+    parser.add_argument('--no_prerender', action='store_true',
+                        help='Do not render the figures of the default dashboard view afterwards')
+
+    args = parser.parse_args()
+    return args
+
+
+def backfill(log_folder: str, workers: int | None = None, chunk_days: int = CHUNK_DAYS,
+             player_change_windows: tuple[int, ...] = process.PLAYER_CHANGE_WINDOWS,
+             output_formats: tuple[str, ...] = process.OUTPUT_FORMATS, prerender_figures: bool = True) -> int:
+    """Rebuilds the outputs of `log_folder` like `process.process(rebuild=True)`, parsing the raw log in parallel.
+
+    The workers parse chunks of whole days and compute the player changes of their rows, with the rows of the
+    longest window before the chunk read again as context. Parsing is what takes the time, the match, event and
+    rollup steps are vectorized and carry state from the first row on, so they run once on the stitched timeline.
+    Stop the processor while backfilling, both write the same outputs.
+    """
+    starttime = time.time()
+    player_change_windows = tuple(player_change_windows)
+    output_formats = process.get_output_formats(output_formats)
+    days = [partition['day'] for partition in raw_log.load_manifest(log_folder)['partitions']]
+    chunks = [days[i:i + chunk_days] for i in range(0, len(days), chunk_days)]
+    longest_window = pd.Timedelta(minutes=max(player_change_windows))
+    with ProcessPoolExecutor(workers) as executor:
+        futures = [executor.submit(process_chunk, log_folder, chunk, get_context_days(days, chunk[0], longest_window),
+                                   longest_window, player_change_windows) for chunk in chunks]
+        results = [future.result() for future in futures]
+    timelines = [timeline for timeline, _ in results]
+    timeline_data = pd.concat(timelines, ignore_index=True) if timelines else pd.DataFrame()
+    raw_position = results[-1][1] if results else None
+    processed_rows = process.write_full(log_folder, timeline_data, raw_position, player_change_windows, output_formats)
+    if processed_rows > 0:
+        generation = process.publish_generation(log_folder)
+        if prerender_figures:
+            process.prerender_default_figures(log_folder, generation)
+    endtime = time.time()
+    logging.info(f'Backfill took {endtime - starttime:.2f} seconds '
+                 f'({len(days)} days in {len(chunks)} chunks, {processed_rows} rows).')
+    process.metrics.observe('run_seconds', endtime - starttime, mode='backfill')
+    process.metrics.save(log_folder)
+    return processed_rows
+
+
+def get_context_days(days: list[str], first_day: str, longest_window: pd.Timedelta) -> list[str]:
+    """The days before `first_day` that can have rows within the longest window of its first row."""
+    start_day = (pd.Timestamp(first_day) - longest_window).strftime('%Y-%m-%d')
+    return [day for day in days if start_day <= day < first_day]
+
+
+def process_chunk(log_folder: str, days: list[str], context_days: list[str], longest_window: pd.Timedelta,
+                  player_change_windows: tuple[int, ...]) -> tuple[pd.DataFrame, dict | None]:
+    """The timeline of `days` with its player changes, and the raw log position after them."""
+    raw_data_with_errors, raw_position = raw_log.read_raw_log(log_folder, first_day=days[0], last_day=days[-1])
+    timeline = process.parse_timeline(raw_data_with_errors)
+    if context_days:
+        context, _ = raw_log.read_raw_log(log_folder, first_day=context_days[0], last_day=context_days[-1])
+        # a minute more than the window, the times are UTC ISO 8601 so they compare as strings
+        start = (pd.Timestamp(days[0], tz='UTC') - longest_window - pd.Timedelta(minutes=1)).isoformat()[:16]
+        context_timeline = process.parse_timeline(context[context['time'].astype(str).str[:16] >= start])
+        # after a gap in the poller the context can be empty
+        if len(context_timeline):
+            combined = pd.concat([context_timeline, timeline], ignore_index=True)
+            timeline = process.add_player_change(combined, player_change_windows).iloc[len(context_timeline):]
+        else:
+            timeline = process.add_player_change(timeline.reset_index(drop=True), player_change_windows)
+    else:
+        timeline = process.add_player_change(timeline.reset_index(drop=True), player_change_windows)
+    logging.info(f'Parsed {days[0]} to {days[-1]} ({len(timeline)} rows).')
+    return timeline.reset_index(drop=True), raw_position
+
+
+def verify(log_folder: str, workers: int | None = None, chunk_days: int = CHUNK_DAYS,
+           player_change_windows: tuple[int, ...] = process.PLAYER_CHANGE_WINDOWS,
+           output_formats: tuple[str, ...] = process.OUTPUT_FORMATS) -> bool:
+    """Backfills and runs the serial processing on the raw log of `log_folder` in two temporary folders,
+    and compares every output file of them. Returns whether they are all the same."""
+    with tempfile.TemporaryDirectory() as folder:
+        serial_folder = os.path.join(folder, 'serial')
+        backfill_folder = os.path.join(folder, 'backfill')
+        # the poller may be writing, copy the raw log once so both runs see the same rows
+        shutil.copytree(os.path.join(log_folder, raw_log.RAW_LOG_FOLDER),
+                        os.path.join(serial_folder, raw_log.RAW_LOG_FOLDER))
+        shutil.copytree(serial_folder, backfill_folder)
+        process.process(serial_folder, rebuild=True, player_change_windows=player_change_windows,
+                        output_formats=output_formats, prerender_figures=False)
+        backfill(backfill_folder, workers, chunk_days, player_change_windows, output_formats, prerender_figures=False)
+
+        ok = True
+        for filename in sorted(os.listdir(serial_folder)):
+            if filename == raw_log.RAW_LOG_FOLDER or filename == metrics.METRICS_FILE.format(component='processor'):
+                continue
+            backfill_path = os.path.join(backfill_folder, filename)
+            if not os.path.exists(backfill_path):
+                logging.error(f'{filename} is missing from the backfill.')
+                ok = False
+            elif not filecmp.cmp(os.path.join(serial_folder, filename), backfill_path, shallow=False):
+                logging.error(f'{filename} differs from the serial run.')
+                ok = False
+        if ok:
+            logging.info('The backfill matches the serial run.')
+        return ok
+
+
+def main():
+    args = parse_args()
+    process.check_player_change_windows(args.player_change_windows)
+    if args.verify:
+        ok = verify(args.log_folder, args.workers, args.chunk_days, args.player_change_windows, args.output_formats)
+        raise SystemExit(0 if ok else 1)
+    backfill(args.log_folder, args.workers, args.chunk_days, args.player_change_windows, args.output_formats,
+             prerender_figures=not args.no_prerender)
+
+
+if __name__ == '__main__':
+    main()
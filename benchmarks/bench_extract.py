@@ -0,0 +1,101 @@
+"""Per-page CPU time of the server info extraction, the old full page parse against extract.py.
+
+Run from the repository root: python benchmarks/bench_extract.py --pages <folder>
+The pages are the .html files of the folder, battlemetrics_*.html and squadservers_*.html. The fixtures are
+only the server info markup of both sites, they check that the extraction matches the full parse but their
+timings say nothing about real pages. Save real ones first, at least one seeding and one live page per site:
+python benchmarks/bench_extract.py --pages <folder> --save_pages -B <battlemetrics id> -S <squad-servers.com id>
+"""
+from __future__ import annotations
+
+import argparse
+import glob
+import os
+import re
+import sys
+import time
+from datetime import datetime, timezone
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import extract  # noqa: E402
+from http_client import HttpClient  # noqa: E402
+from query import BATTLEMETRICS_URL, SQUADSERVERS_URL  # noqa: E402
+
+FIXTURE_FOLDER = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark server info extraction')
+    parser.add_argument('--repeat', type=int, help='Parses per page', default=50)
+    parser.add_argument('--pages', type=str, help='Folder of the saved pages', default=FIXTURE_FOLDER)
+    parser.add_argument('--save_pages', action='store_true',
+                        help='Save the current pages of the servers to the folder instead of benchmarking')
+    parser.add_argument('--server_id_battlemetrics', '-B', type=int, help='Battlemetrics ID')
+    parser.add_argument('--server_id_squadservers', '-S', type=int, help='Squad-servers.com ID')
+
+    args = parser.parse_args()
+    return args
+
+
+def full_parse_battlemetrics(html: str) -> str | None:
+    soup = BeautifulSoup(html, features='html.parser')
+    server_info = soup.find('div', {'class': 'server-info'})
+    return None if server_info is None else server_info.get_text(separator=';')
+
+
+def full_parse_squadservers(html: str) -> str | None:
+    soup = BeautifulSoup(html, features='html.parser')
+    server_info = soup.find('table', {'class': 'table table-bordered'})
+    return None if server_info is None else re.sub(r'\s', '', server_info.get_text(separator=';'))
+
+
+def save_pages(args: argparse.Namespace):
+    """Saves the current page of the servers as <site>_<id>_<UTC time>.html."""
+    client = HttpClient()
+    time_string = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')
+    os.makedirs(args.pages, exist_ok=True)
+    for site, url, server_id in [('battlemetrics', BATTLEMETRICS_URL, args.server_id_battlemetrics),
+                                 ('squadservers', SQUADSERVERS_URL, args.server_id_squadservers)]:
+        if server_id is None:
+            continue
+        result = client.get(url.format(server_id=server_id))
+        if result.status != 200 or result.text is None:
+            print(f'{site}: {result.error or result.status}, not saved')
+            continue
+        path = os.path.join(args.pages, f'{site}_{server_id}_{time_string}.html')
+        with open(path, 'w', encoding='utf-8') as outfile:
+            outfile.write(result.text)
+        print(f'Saved {path}')
+
+
+def cpu_time_per_call(function, html: str, repeat: int) -> float:
+    starttime = time.process_time()
+    for _ in range(repeat):
+        function(html)
+    return (time.process_time() - starttime) / repeat
+
+
+def main():
+    args = parse_args()
+    if args.save_pages:
+        save_pages(args)
+        return
+    print(f'{"page":<32}{"kB":>8}{"full parse ms":>16}{"extract ms":>14}{"speedup":>10}')
+    for path in sorted(glob.glob(os.path.join(args.pages, '*.html'))):
+        with open(path, encoding='utf-8') as infile:
+            html = infile.read()
+        if os.path.basename(path).startswith('battlemetrics'):
+            old, new = full_parse_battlemetrics, extract.extract_battlemetrics
+        else:
+            old, new = full_parse_squadservers, extract.extract_squadservers
+        assert new(html).text == old(html), f'{path}: extracted text differs from the full parse'
+        old_time = cpu_time_per_call(old, html, args.repeat)
+        new_time = cpu_time_per_call(new, html, args.repeat)
+        print(f'{os.path.basename(path):<32}{len(html) / 1000:>8.0f}{old_time * 1000:>16.2f}{new_time * 1000:>14.2f}'
+              f'{old_time / new_time:>9.0f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""Wall time of the processing steps and the dashboard callbacks against the length of the history.
+
+Run from the repository root: python benchmarks/bench_pipeline.py --days 1 30 365
+The raw logs are generated by generate_raw_log.py into --data_folder once and reused by later runs.
+The callbacks are timed without the result cache, on all of the history, its last week and its last day.
+Save a baseline with --save_baseline and compare a later run to it with --baseline.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+from inspect import unwrap
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import dashboard  # noqa: E402
+import prerender  # noqa: E402
+import process  # noqa: E402
+import raw_log  # noqa: E402
+import schema  # noqa: E402
+from datastore import DataStore  # noqa: E402
+from generate_raw_log import generate  # noqa: E402
+
+CALLBACKS = {
+    'update_timeline': lambda relayout: unwrap(dashboard.update_timeline)(0, relayout),
+    'create_piecharts': lambda relayout: unwrap(dashboard.create_piecharts)(relayout),
+    'create_frequent_layers': lambda relayout: unwrap(dashboard.create_frequent_layers)(relayout),
+    'create_seed_live_charts': lambda relayout: unwrap(dashboard.create_seed_live_charts)(relayout),
+    'create_population_charts': lambda relayout: unwrap(dashboard.create_population_charts)(relayout),
+}
+RANGES = {'all': None, 'week': 7, 'day': 1}  # days before the end of the history
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark processing and dashboard callbacks')
+    parser.add_argument('--days', type=int, nargs='+', help='Lengths of history to run on, in days',
+                        default=[1, 7, 30, 365, 1825])
+    parser.add_argument('--repeat', type=int, help='Runs per step, the fastest one is reported', default=3)
+    parser.add_argument('--data_folder', type=str, help='Folder for the generated logs',
+                        default=os.path.join(tempfile.gettempdir(), 'squad-dashboard-bench'))
+    parser.add_argument('--save_baseline', type=str, help='Write the results to this JSON file')
+    parser.add_argument('--baseline', type=str, help='Compare the results to this JSON file')
+
+    args = parser.parse_args()
+    return args
+
+
+def best_time(function, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        starttime = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - starttime)
+    return min(times)
+
+
+def get_log_folder(data_folder: str, days: int) -> str:
+    log_folder = os.path.join(data_folder, f'{days}d')
+    if not raw_log.load_manifest(log_folder)['partitions']:
+        print(f'generating {days} days of raw log in {log_folder}', file=sys.stderr)
+        generate(log_folder, days)
+    return log_folder
+
+
+def bench_history(log_folder: str, repeat: int) -> dict[str, float]:
+    results = {}
+    raw_data_with_errors, _ = raw_log.read_raw_log(log_folder)
+    results['read_raw_log'] = best_time(lambda: raw_log.read_raw_log(log_folder), repeat)
+    results['create_timeline'] = best_time(lambda: process.create_timeline(raw_data_with_errors), repeat)
+    timeline_data = process.create_timeline(raw_data_with_errors)
+    results['create_match_data'] = best_time(lambda: process.create_match_data(timeline_data), repeat)
+    results['create_event_log'] = best_time(lambda: process.create_event_log(timeline_data), repeat)
+    results['process_full'] = best_time(lambda: process.process(log_folder, rebuild=True, prerender_figures=False),
+                                        repeat)
+
+    def load_tables():
+        dashboard.data_store = DataStore(log_folder, dashboard.read_file)
+        for table in [*dashboard.TIMELINE_LEVEL_TABLES, schema.MATCH_TABLE, schema.SEED_LIVE_TABLE,
+                      schema.MATCH_ROLLUP_TABLE, schema.EVENT_ROLLUP_TABLE, schema.POPULATION_ROLLUP_TABLE,
+                      schema.SEED_CURVE_ROLLUP_TABLE]:
+            dashboard.load_file(table)
+    results['dashboard_load'] = best_time(load_tables, repeat)
+    results['prerender'] = best_time(lambda: prerender.prerender(log_folder, 0), repeat)
+
+    end = dashboard.load_file(schema.TIMELINE_TABLE)['time'].iloc[-1]
+    for range_name, days in RANGES.items():
+        relayout = None if days is None else {
+            'xaxis.range': [str(end - pd.Timedelta(days=days)), str(end)]}
+        for name, callback in CALLBACKS.items():
+            results[f'{name}[{range_name}]'] = best_time(lambda: callback(relayout), repeat)
+    return results
+
+
+def print_results(results: dict[str, dict[str, float]], baseline: dict[str, dict[str, float]] | None):
+    days = list(results)
+    steps = list(results[days[0]])
+    print(f'{"ms":<36}' + ''.join(f'{f"{day} days":>18}' for day in days))
+    for step in steps:
+        line = f'{step:<36}'
+        for day in days:
+            value = f'{results[day][step] * 1000:.1f}'
+            previous = (baseline or {}).get(day, {}).get(step)
+            if previous:
+                value += f' {results[day][step] / previous:.2f}x'
+            line += f'{value:>18}'
+        print(line)
+    if baseline is not None:
+        print('(n.nnx: time relative to the baseline)')
+
+
+def main():
+    args = parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+    results = {}
+    for days in args.days:
+        results[str(days)] = bench_history(get_log_folder(args.data_folder, days), args.repeat)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as infile:
+            baseline = json.load(infile)['results']
+    print_results(results, baseline)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as outfile:
+            json.dump({'python': platform.python_version(), 'machine': platform.machine(), 'results': results},
+                      outfile, indent=1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+"""Writes a synthetic raw query log in daily partitions, like the poller does, for benchmarks and load tests.
+
+Run from the repository root: python benchmarks/generate_raw_log.py --output_folder /tmp/bench --days 30
+Every day the server seeds from empty in the morning, goes live, peaks and empties in the night, on some days
+the seeding fails. Seed layers are played while seeding and a rotation of live layers after it. Most rows come
+from Battlemetrics and the rest from squad-servers.com, with single failed queries, outages of ERROR rows and
+gaps where the poller was down.
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import gzip
+import io
+import math
+import os
+import random
+import sys
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import raw_log  # noqa: E402
+from extract import BATTLEMETRICS, SQUADSERVERS, ServerInfo  # noqa: E402
+
+MAPS = ['AlBasrah', 'Anvil', 'Belaya', 'BlackCoast', 'Chora', 'Fallujah', 'FoolsRoad', 'GooseBay', 'Gorodok',
+        'Harju', 'Kamdesh', 'Kohat', 'Kokan', 'Lashkar', 'Logar', 'Manicouagan', 'Mestia', 'Mutaha', 'Narva',
+        'Sanxian', 'Skorpo', 'Sumari', 'Tallil', 'Yehorivka']
+LIVE_MODES = ['RAAS', 'RAAS', 'RAAS', 'AAS', 'AAS', 'Invasion', 'TC', 'Insurgency']
+SEED_LAYERS = [f'{map_name}_Seed_v{version}' for map_name in ('Sumari', 'Logar', 'Tallil', 'Fallujah')
+               for version in (1, 2)]
+ERROR_CODES = ['timeout', 'timeout', 'connection_error', 'request_error', 'no_server_info', 'incomplete_server_info']
+MAX_PLAYERS = 100
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Generate a synthetic raw query log')
+    parser.add_argument('--output_folder', type=str, help='Log folder to write the raw log to', required=True)
+    parser.add_argument('--days', type=int, help='Days of history', default=30)
+    parser.add_argument('--servers', type=int, default=1,
+                        help='Number of servers, more than one are written to server_<n> subfolders')
+    parser.add_argument('--start', type=str, help='First day, UTC', default='2021-01-01')
+    parser.add_argument('--interval', type=float, help='Seconds between queries', default=60)
+    parser.add_argument('--compact', action='store_true', help='Write the compact rows of query.py --compact_raw_log')
+    parser.add_argument('--seed', type=int, help='Random seed', default=0)
+
+    args = parser.parse_args()
+    return args
+
+
+class SyntheticServer:
+    """The player count and layer of a simulated server, advanced one query at a time."""
+
+    def __init__(self, rng: random.Random, popularity: float):
+        self.rng = rng
+        self.popularity = popularity  # peak player count on a good day
+        self.players = 0.0
+        self.layer = rng.choice(SEED_LAYERS)
+        self.layer_end = None
+        self.day = None
+        self.plan = None
+        self.live_layers = [f'{map_name}_{mode}_v{rng.randint(1, 3)}' for map_name in MAPS for mode in LIVE_MODES]
+
+    def plan_day(self, day: datetime):
+        """When seeding starts and how long it takes, the peak and when the server empties."""
+        rng = self.rng
+        self.plan = {
+            'seed_start': day + timedelta(hours=rng.uniform(7, 12)),
+            'seed_hours': rng.uniform(1, 4),
+            'peak': min(MAX_PLAYERS, self.popularity * rng.uniform(0.75, 1.05)),
+            'decline_start': day + timedelta(hours=rng.uniform(20, 23.5)),
+            'decline_hours': rng.uniform(1.5, 4),
+            'failed': rng.random() < 0.08,
+        }
+
+    def target(self, time: datetime) -> float:
+        plan = self.plan
+        if time < plan['seed_start']:
+            return 1
+        hours = (time - plan['seed_start']).total_seconds() / 3600
+        if plan['failed']:  # a few players join and give up
+            return 12 * math.exp(-((hours - 1) ** 2))
+        # a logistic seeding curve from empty to past the live threshold, then up to the peak
+        seeding = 70 / (1 + math.exp(-8 * (hours / plan['seed_hours'] - 0.6)))
+        level = min(plan['peak'], seeding + max(0.0, hours - plan['seed_hours']) * 15)
+        if time > plan['decline_start']:
+            decline = (time - plan['decline_start']).total_seconds() / 3600 / plan['decline_hours']
+            level *= max(0.0, 1 - decline)
+        return level
+
+    def step(self, time: datetime) -> tuple[int, str]:
+        day = time.replace(hour=0, minute=0, second=0, microsecond=0)
+        if day != self.day:
+            self.day = day
+            self.plan_day(day)
+        target = self.target(time)
+        self.players += (target - self.players) * 0.3 + self.rng.gauss(0, 0.3 + self.players * 0.03)
+        self.players = min(max(self.players, 0.0), MAX_PLAYERS)
+        seeding = '_Seed_' in self.layer
+        if seeding and self.players > 50:  # seeded, the admins switch to a live layer
+            self.next_layer(time, live=True)
+        elif self.layer_end is not None and time >= self.layer_end:
+            self.next_layer(time, live=self.players >= 30)
+        elif self.layer_end is None and not seeding:
+            self.next_layer(time, live=True)
+        return round(self.players), self.layer
+
+    def next_layer(self, time: datetime, live: bool):
+        if live:
+            self.layer = self.rng.choice(self.live_layers)
+            self.layer_end = time + timedelta(minutes=self.rng.uniform(45, 110))
+        else:
+            self.layer = self.rng.choice(SEED_LAYERS)
+            self.layer_end = None  # until seeded
+
+
+def generate_rows(rng: random.Random, start: datetime, days: int, interval: float, compact: bool):
+    """(time, row) of every query, in time order."""
+    server = SyntheticServer(rng, popularity=rng.uniform(70, 100))
+    end = start + timedelta(days=days)
+    time = start
+    outage_end = time
+    rank = rng.randint(1, 500)
+    while time < end:
+        if rng.random() < 1 / (14 * 86400 / interval):  # the poller was down
+            time += timedelta(minutes=rng.uniform(10, 360))
+            continue
+        player_count, layer = server.step(time)
+        if time < outage_end:
+            row = 'ERROR:connection_error'
+        elif rng.random() < 1 / (3 * 86400 / interval):  # the sites are unreachable for a while
+            outage_end = time + timedelta(minutes=rng.uniform(5, 120))
+            row = 'ERROR:connection_error'
+        elif rng.random() < 0.005:
+            row = f'ERROR:{rng.choice(ERROR_CODES)}'
+        else:
+            row = create_row(rng, player_count, layer, rank, compact)
+        yield time, row
+        time += timedelta(seconds=interval * rng.uniform(0.97, 1.05))
+
+
+def create_row(rng: random.Random, player_count: int, layer: str, rank: int, compact: bool) -> str:
+    if rng.random() < 0.85:
+        text = (f'Rank;#{rank};Player count;{player_count}/{MAX_PLAYERS};Address;203.0.113.7:7787;'
+                f'Status;online;Map;{layer};Country;DE')
+        info = ServerInfo(BATTLEMETRICS, player_count, MAX_PLAYERS, layer, str(rank), text)
+    else:
+        text = (f';;;Status;;Online;;Players;;{player_count}/{MAX_PLAYERS};;Map;;{layer};;Rank;;{rank};;'
+                f'Address;;203.0.113.7:27165')
+        info = ServerInfo(SQUADSERVERS, player_count, MAX_PLAYERS, layer, str(rank), text)
+    return info.to_row(compact)
+
+
+def write_raw_log(log_folder: str, rows) -> int:
+    """Writes the rows to daily partitions with their manifest, the days before the last one compressed."""
+    folder = os.path.join(log_folder, raw_log.RAW_LOG_FOLDER)
+    os.makedirs(folder, exist_ok=True)
+    manifest = {'partitions': []}
+    row_count = 0
+    day = None
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def write_partition(last: bool):
+        content = buffer.getvalue().encode('utf-8')
+        filename = f'{day}.csv' if last else f'{day}.csv.gz'
+        path = os.path.join(folder, filename)
+        with open(path, 'wb') if last else gzip.open(path, 'wb') as outfile:
+            outfile.write(content)
+        manifest['partitions'].append({'day': day, 'file': filename, 'compressed': not last,
+                                       'size': None if last else len(content)})
+
+    for time, row in rows:
+        time = time.isoformat()
+        if raw_log.get_day(time) != day:
+            if day is not None:
+                write_partition(last=False)
+                buffer.seek(0)
+                buffer.truncate()
+            day = raw_log.get_day(time)
+        writer.writerow([time, row])
+        row_count += 1
+    if day is not None:
+        write_partition(last=True)
+    raw_log.save_manifest(log_folder, manifest)
+    return row_count
+
+
+def generate(log_folder: str, days: int, start: str = '2021-01-01', interval: float = 60, compact: bool = False,
+             seed: int = 0) -> int:
+    rng = random.Random(seed)
+    start_time = datetime.fromisoformat(start).replace(tzinfo=timezone.utc)
+    return write_raw_log(log_folder, generate_rows(rng, start_time, days, interval, compact))
+
+
+def main():
+    args = parse_args()
+    for server in range(args.servers):
+        log_folder = args.output_folder if args.servers == 1 else os.path.join(args.output_folder, f'server_{server}')
+        rows = generate(log_folder, args.days, args.start, args.interval, args.compact, args.seed + server)
+        print(f'{log_folder}: {rows} rows')
+
+
+if __name__ == '__main__':
+    main()
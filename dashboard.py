@@ -1,22 +1,56 @@
 from __future__ import annotations
 
 import datetime
+import functools
+import gzip
+import hashlib
+import json
 import math
-import os.path
+import os
+import time
 from collections import defaultdict
-
-from cachetools import cached, TTLCache
+from typing import Callable
 
 import plotly.graph_objects as go
+import plotly.utils
 import flask
-from dash import Dash, html, dcc, callback, Output, Input, dash_table
+from dash import Dash, html, dcc, callback, clientside_callback, ClientsideFunction, Output, Input, State, dash_table
 import plotly.express as px
 import pandas as pd
 import plotly.subplots
 
-TIMELINE_FILE = 'processed_timeline.csv'
-MATCH_FILE = 'match_info.csv'
-SEED_LIVE_FILE = 'seed_live_info.csv'
+import metrics
+import rollup
+import schema
+import storage
+from datastore import DataStore
+from profiler import SamplingProfiler
+from result_cache import ResultCache
+from downsample import PYRAMID_LEVELS, get_level_table
+from schema import (EVENT_ROLLUP_TABLE, GENERATION_FILE, MATCH_ROLLUP_TABLE, MATCH_TABLE, POPULATION_ROLLUP_TABLE,
+                    PRERENDERED_FILE, SEED_CURVE_ROLLUP_TABLE, SEED_LIVE_TABLE, STATUS_FILE, TIMELINE_TABLE)
+
+# the timeline levels from every sample to the coarsest downsampled one
+TIMELINE_LEVEL_TABLES = [TIMELINE_TABLE] + [get_level_table(TIMELINE_TABLE, minutes) for minutes in PYRAMID_LEVELS]
+TIMELINE_POINTS = 2000  # timeline rows sent for the whole history, and as many again for the zoomed range
+RANGE_GRANULARITY = '1min'  # selected ranges are widened to multiples of this, so that cached results can be reused
+RESULT_CACHE_BYTES = 64 * 1024 * 1024
+STATUS_REFRESH_SECONDS = 60
+UPDATE_CHECK_SECONDS = 1  # how often every update stream checks for a new processor run
+KEEP_ALIVE_SECONDS = 15
+MAX_PUSHED_POINTS = 500  # above this many new timeline rows the timeline is rebuilt instead of extended
+TIME_COLUMNS = {MATCH_ROLLUP_TABLE: 'day', EVENT_ROLLUP_TABLE: 'day', POPULATION_ROLLUP_TABLE: 'week',
+                SEED_CURVE_ROLLUP_TABLE: 'week'}  # 'time' for the other tables
+MATCH_TABLE_COLUMNS = {'time': 'time', 'layer': 'previous_layer', 'minutes': 'minutes', 'players': 'mean_player_count',
+                       'map': 'map_name', 'version': 'version'}  # shown name: column of the match table
+# opt-in: callbacks slower than this many seconds save a sampled profile to PROFILE_FOLDER, 0 turns it off
+DATA_FOLDER = os.environ.get('SQUAD_DASHBOARD_DATA_FOLDER', 'data')  # the log folder of the server to show
+PROFILE_SLOW_SECONDS = float(os.environ.get('SQUAD_DASHBOARD_PROFILE_SLOW_SECONDS', 0))
+PROFILE_FOLDER = 'profiles'
+COMPRESS_MIN_BYTES = 1024  # smaller responses are sent as they are
+COMPRESS_LEVEL = 6
+COMPRESS_MIMETYPES = {'application/json', 'application/javascript', 'text/javascript', 'text/html', 'text/css',
+                      'text/plain'}
 
 styles = {
     'pre': {
@@ -39,19 +73,232 @@ app = Dash(__name__, server=server, title='Skira server statistics',
            url_base_pathname='/squad-dashboard/')  # type: ignore
 
 
-@cached(cache=TTLCache(maxsize=5, ttl=60))
-def load_file(filename: str) -> pd.DataFrame:
-    return pd.read_csv(os.path.join('data', filename))
+def read_file(path: str, table: str) -> pd.DataFrame:
+    time_column = TIME_COLUMNS.get(table, 'time')
+    df = storage.load_table(path)
+    # filter_df_for_timeline and the rollups binary search the time column
+    if not df[time_column].is_monotonic_increasing:
+        df = df.sort_values(time_column, ignore_index=True, kind='stable')
+    return df
+
+
+data_store = DataStore(DATA_FOLDER, read_file)
+result_cache = ResultCache(max_bytes=RESULT_CACHE_BYTES)
+dashboard_metrics = metrics.Metrics('dashboard')  # per worker process, like the caches
+
+
+def load_file(table: str) -> pd.DataFrame:
+    return data_store.get(table)
 
 
-@cached(cache=TTLCache(maxsize=5, ttl=60))
-def get_map_color_palette(_cache_key: str) -> dict[str, str]:
-    df = pd.read_csv(os.path.join('data', 'match_info.csv'))
+def get_map_color_palette() -> dict[str, str]:
+    return data_store.derive('map_color_palette', [MATCH_TABLE], create_map_color_palette)
+
+
+def create_map_color_palette(df: pd.DataFrame) -> dict[str, str]:
     custom_color_palette = px.colors.qualitative.Dark24
     colormap = dict(zip(df['map_name'].unique(), custom_color_palette * 2))
     return colormap
 
 
+def cache_by_range(tables: list[str]):
+    """Caches the results of a callback whose last argument is the relayout of the timeline
+    by the selected range, snapped to RANGE_GRANULARITY, and the versions of the tables it reads."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args):
+            relayout = snap_relayout(args[-1])
+            key = (function.__name__, data_store.versions(tables), get_timeframe(relayout))
+            computed = []
+
+            def compute():
+                computed.append(True)
+                return function(*args[:-1], relayout)
+            result = result_cache.get_or_compute(key, compute)
+            dashboard_metrics.inc('cache_requests_total', callback=function.__name__,
+                                  result='miss' if computed else 'hit')
+            size = result_cache.get_size(key)
+            if size is not None:
+                dashboard_metrics.observe('payload_bytes', size, callback=function.__name__)
+            return result
+        return wrapper
+    return decorator
+
+
+def serve_prerendered(function):
+    """For callbacks whose last argument is the relayout of the timeline: the default view (no range selected)
+    is served from the figures the processor rendered for the current data, if they are there already."""
+    @functools.wraps(function)
+    def wrapper(*args):
+        if get_timeframe(snap_relayout(args[-1])) is None:
+            figure = get_prerendered_figure(function.__name__)
+            if figure is not None:
+                dashboard_metrics.inc('prerendered_total', callback=function.__name__)
+                return figure
+        return function(*args)
+    return wrapper
+
+
+def get_prerendered_figure(name: str) -> dict | None:
+    """The figure of the default view of the callback, None if it's not rendered for the current data generation."""
+    path = os.path.join(data_store.folder, PRERENDERED_FILE)
+    try:
+        with open(os.path.join(data_store.folder, GENERATION_FILE), encoding='utf-8') as infile:
+            generation = int(infile.read() or 0)
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    prerendered = read_prerendered(path, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+    if prerendered['generation'] != generation:
+        return None
+    return prerendered['figures'].get(name)
+
+
+@functools.lru_cache(maxsize=1)
+def read_prerendered(path: str, *signature) -> dict:
+    """Parsed once per version of the file, the signature is only part of the cache key."""
+    with open(path, encoding='utf-8') as infile:
+        return json.load(infile)
+
+
+def measure_callback(function):
+    """Records the latency of the callback. With PROFILE_SLOW_SECONDS set, the stacks of the slow calls are
+    sampled and saved as <callback>-<time>.folded to PROFILE_FOLDER, for flamegraph.pl or speedscope."""
+    @functools.wraps(function)
+    def wrapper(*args):
+        starttime = time.perf_counter()
+        profiler = SamplingProfiler() if PROFILE_SLOW_SECONDS > 0 else None
+        try:
+            if profiler is None:
+                return function(*args)
+            with profiler:
+                return function(*args)
+        finally:
+            duration = time.perf_counter() - starttime
+            dashboard_metrics.observe('callback_seconds', duration, callback=function.__name__)
+            if profiler is not None and duration >= PROFILE_SLOW_SECONDS:
+                profile_time = datetime.datetime.now().strftime('%Y%m%dT%H%M%S.%f')
+                profiler.save(os.path.join(PROFILE_FOLDER, f'{function.__name__}-{profile_time}.folded'))
+    return wrapper
+
+
+def read_status() -> bytes | None:
+    try:
+        with open(os.path.join(data_store.folder, STATUS_FILE), 'rb') as infile:
+            return infile.read()
+    except FileNotFoundError:
+        return None
+
+
+@server.route('/squad-dashboard/api/status')
+def status_api():
+    """The status snapshot as JSON.
+    Pollers should send back the ETag in If-None-Match to get a 304 if it's unchanged."""
+    content = read_status()
+    if content is None:
+        return flask.jsonify({'error': 'no status yet'}), 503
+    response = flask.Response(content, mimetype='application/json')
+    response.set_etag(hashlib.sha1(content).hexdigest())
+    response.cache_control.no_cache = True
+    return response.make_conditional(flask.request)
+
+
+@server.route('/squad-dashboard/api/updates')
+def updates_api():
+    """Server-sent events: an `update` event after every processor run, with the new timeline rows and the status.
+    Every open stream holds a thread, so gunicorn runs threaded workers, see gunicorn.conf.py."""
+    last_event_id = flask.request.headers.get('Last-Event-ID')  # the time of the last row sent before a reconnect
+    return flask.Response(generate_updates(last_event_id), mimetype='text/event-stream',
+                          headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+def generate_updates(last_time: str | None):
+    content = read_status()
+    if last_time is None and content is not None:
+        last_time = json.loads(content)['time']
+    yield f'retry: {KEEP_ALIVE_SECONDS * 1000}\n\n'
+    idle_seconds = 0
+    while True:
+        time.sleep(UPDATE_CHECK_SECONDS)
+        new_content = read_status()
+        if new_content is None or new_content == content:
+            idle_seconds += UPDATE_CHECK_SECONDS
+            if idle_seconds >= KEEP_ALIVE_SECONDS:  # keeps proxies from closing the connection
+                idle_seconds = 0
+                yield ': keep-alive\n\n'
+            continue
+        content, idle_seconds = new_content, 0
+        update = create_update(json.loads(content), last_time)
+        last_time = update['status']['time']
+        yield f'id: {last_time}\nevent: update\ndata: {json.dumps(update, cls=plotly.utils.PlotlyJSONEncoder)}\n\n'
+
+
+def create_update(status: dict, last_time: str | None) -> dict:
+    """The timeline rows after `last_time`, or `full` if there are too many of them to append to the figure."""
+    df = load_file(TIMELINE_TABLE)
+    start = df['time'].searchsorted(pd.Timestamp(last_time), side='right') if last_time is not None else len(df)
+    new_rows = df.iloc[start:]
+    full = len(new_rows) > MAX_PUSHED_POINTS
+    columns = ['time', 'player_count', 'layer', 'source'] + [c for c in df.columns if c.startswith('player_change_')]
+    return {
+        'status': status,
+        'first_time': new_rows['time'].iloc[0] if len(new_rows) else None,
+        'full': full,
+        'points': None if full else {column: new_rows[column].astype(object).tolist() for column in columns},
+    }
+
+
+def update_on_new_data(function):
+    """For callbacks whose last input is a live update store, it only triggers them and is not passed on.
+    The browser only sets the stores for the updates that change the figures, see takeUpdate in live_updates.js."""
+    @functools.wraps(function)
+    def wrapper(*args):
+        *args, _update = args
+        return function(*args)
+    return wrapper
+
+
+@server.route('/squad-dashboard/cache-stats')
+def cache_stats():
+    return flask.jsonify({'data_store': data_store.stats(), 'result_cache': result_cache.stats()})
+
+
+@server.route('/squad-dashboard/metrics')
+def metrics_endpoint():
+    """The metrics of this worker, and of the poller and the processor of the data folder, for Prometheus."""
+    caches = {'data_store': data_store.stats(), 'result_cache': result_cache.stats()}
+    cache_snapshot = {'component': 'dashboard', 'metrics': [
+        ['gauge', f'{cache}_{name}', {}, value] for cache, stats in caches.items() for name, value in stats.items()]}
+    snapshots = [dashboard_metrics.snapshot(), cache_snapshot]
+    snapshots += [snapshot for snapshot in (metrics.load_snapshot(data_store.folder, component)
+                                            for component in ('poller', 'processor')) if snapshot is not None]
+    return flask.Response(metrics.render(snapshots), mimetype='text/plain; version=0.0.4')
+
+
+@server.route('/squad-dashboard/memory')
+def memory_stats():
+    return flask.jsonify(schema.memory_report(data_store.tables()))
+
+
+@server.after_request
+def compress_response(response: flask.Response) -> flask.Response:
+    """Gzips the callback payloads and the assets for the browsers that accept it. The figures are JSON with
+    long runs of similar numbers, they shrink a lot. Streams like the update events are left alone."""
+    if (response.direct_passthrough or response.is_streamed or response.status_code != 200
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESS_MIMETYPES
+            or 'gzip' not in flask.request.headers.get('Accept-Encoding', '')):
+        return response
+    content = response.get_data()
+    if len(content) < COMPRESS_MIN_BYTES:
+        return response
+    response.set_data(gzip.compress(content, compresslevel=COMPRESS_LEVEL))
+    response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    dashboard_metrics.inc('compressed_responses_total')
+    dashboard_metrics.inc('compressed_bytes_saved_total', len(content) - response.content_length)
+    return response
+
+
 app.layout = html.Div([
     dcc.Interval(
         id="load-interval",
@@ -59,6 +306,11 @@ app.layout = html.Div([
         max_intervals=0,  # <-- only run once
         interval=1
     ),
+    dcc.Interval(id='status-interval', interval=STATUS_REFRESH_SECONDS * 1000),
+    dcc.Interval(id='live-poll', interval=UPDATE_CHECK_SECONDS * 1000),
+    dcc.Store(id='live-update'),  # every update, for the status and to extend the timeline
+    dcc.Store(id='live-refresh'),  # the updates that add rows to the selected range
+    dcc.Store(id='live-reload'),  # the ones of them too big to extend the timeline with
     html.H1(children=[html.Span('Skira server statistics by Cucuska2 '),
                       html.Img(src=app.get_asset_url('hogwild.png'), style={
                           'height': '48px',
@@ -84,7 +336,16 @@ app.layout = html.Div([
         )], style={'width': '100%', 'display': 'inline-block', 'verticalAlign': 'middle'}),
     ], style={'display': 'flex', 'alignItems': 'center', 'justifyContent': 'center'}),
     html.Div([
-        html.Div(id='match-table', style={'width': '50%'}),
+        html.Div(dash_table.DataTable(
+            id='match-table',
+            columns=[{'name': column, 'id': column} for column in MATCH_TABLE_COLUMNS],
+            page_current=0,
+            page_size=10,
+            page_action='custom',
+            sort_action='custom',
+            sort_by=[],
+            style_table={'overflowX': 'auto', 'minWidth': '0px', 'width': '100%', 'maxWidth': '100%'},
+        ), style={'width': '50%'}),
         dcc.Graph(id='frequent-layers', style={'width': '50%'})
     ], style={
         'display': 'flex',
@@ -95,36 +356,116 @@ app.layout = html.Div([
     }),
     html.Div(children=[
         dcc.Graph(id='seed-timeline')
+    ]),
+    html.Div(children=[
+        dcc.Graph(id='population-patterns')
     ])
 ])
 
 
-def filter_df_for_timeline(df, relayout):
-    timeframe = get_timeframe(relayout)
+def filter_df_for_timeline(df: pd.DataFrame, relayout: dict | None) -> pd.DataFrame:
+    """The rows of `df` (sorted by time) in the selected range, as a slice of it, don't modify it in place."""
+    timeframe = get_selected_range(relayout, df['time'].dt.tz)
     if timeframe is None:
-        filtered_df = df
-    else:
-        starttime, endtime = timeframe
-        filtered_df = df.query('time <= @endtime and time >= @starttime')
-    return filtered_df.copy()
+        return df
+    return slice_time_range(df, *timeframe)
+
+
+def slice_time_range(df: pd.DataFrame, starttime: pd.Timestamp, endtime: pd.Timestamp) -> pd.DataFrame:
+    start = df['time'].searchsorted(starttime, side='left')
+    end = df['time'].searchsorted(endtime, side='right')
+    return df.iloc[start:end]
+
+
+def get_timeline_points(relayout: dict | None) -> pd.DataFrame:
+    """The timeline at the finest level that fits in TIMELINE_POINTS rows for the whole history, with the selected
+    range (and half of its width on both sides, for panning) at the finest level that fits in it.
+    The size of the figure stays the same as the history grows."""
+    overview = get_finest_fitting_level(lambda df: df)
+    timeframe = get_selected_range(relayout, overview['time'].dt.tz)
+    if timeframe is None:
+        return overview
+    starttime, endtime = timeframe
+    padding = (endtime - starttime) / 2
+    starttime, endtime = starttime - padding, endtime + padding
+    zoomed = get_finest_fitting_level(lambda df: slice_time_range(df, starttime, endtime))
+    times = overview['time']
+    return pd.concat([
+        overview.iloc[:times.searchsorted(starttime, side='left')],
+        zoomed,
+        overview.iloc[times.searchsorted(endtime, side='right'):],
+    ], ignore_index=True)
+
+
+def get_finest_fitting_level(select: Callable[[pd.DataFrame], pd.DataFrame]) -> pd.DataFrame:
+    """`select` applied to the finest timeline level where its result fits in TIMELINE_POINTS rows, or to the
+    coarsest level if it fits in none. The levels are loaded from the coarsest on, the finer ones only if needed."""
+    fitting = None
+    for table in reversed(TIMELINE_LEVEL_TABLES):
+        df = select(load_file(table))
+        if len(df) > TIMELINE_POINTS:
+            break
+        fitting = df
+    return fitting if fitting is not None else df
+
+
+def get_match_rollup(relayout: dict | None) -> pd.DataFrame:
+    """Matches per day, layer and player count bucket in the selected range, see `rollup.select_matches`.
+    The rows of the rolled up table are only loaded when a range is selected, like in the functions below."""
+    rollup_df = load_file(MATCH_ROLLUP_TABLE)
+    timeframe = get_selected_range(relayout, rollup_df['day'].dt.tz)
+    if timeframe is None:
+        return rollup_df
+    return rollup.select_matches(rollup_df, load_file(MATCH_TABLE), timeframe)
+
+
+def get_event_rollup(relayout: dict | None) -> pd.DataFrame:
+    rollup_df = load_file(EVENT_ROLLUP_TABLE)
+    timeframe = get_selected_range(relayout, rollup_df['day'].dt.tz)
+    if timeframe is None:
+        return rollup_df
+    return rollup.select_events(rollup_df, load_file(SEED_LIVE_TABLE), timeframe)
+
+
+def get_population_rollup(relayout: dict | None) -> pd.DataFrame:
+    """Samples per hour of the week and player count bucket in the selected range, merged from weekly rollups."""
+    rollup_df = load_file(POPULATION_ROLLUP_TABLE)
+    timeframe = get_selected_range(relayout, rollup_df['week'].dt.tz)
+    if timeframe is None:
+        return rollup_df
+    return rollup.select_population(rollup_df, load_file(TIMELINE_TABLE), timeframe)
+
+
+def get_seed_curve_rollup(relayout: dict | None) -> pd.DataFrame:
+    rollup_df = load_file(SEED_CURVE_ROLLUP_TABLE)
+    timeframe = get_selected_range(relayout, rollup_df['week'].dt.tz)
+    if timeframe is None:
+        return rollup_df
+    return rollup.select_seed_curves(rollup_df, load_file(SEED_LIVE_TABLE), load_file(TIMELINE_TABLE), timeframe)
 
 
 @callback(
     Output('frequent-layers', 'figure'),
-    Input('overall-timeline', 'relayoutData')
+    Input('overall-timeline', 'relayoutData'),
+    Input('live-refresh', 'data'),
 )
+@measure_callback
+@update_on_new_data
+@serve_prerendered
+@cache_by_range([MATCH_TABLE, MATCH_ROLLUP_TABLE])
 def create_frequent_layers(relayout):
-    df = load_file(MATCH_FILE).query('live == True and mean_player_count >= 30')
-    filtered_df = filter_df_for_timeline(df, relayout)
-    grouped_df = filtered_df[['previous_layer', 'minutes']].groupby('previous_layer').agg(['count', 'mean'])
-    grouped_df.columns = grouped_df.columns.droplevel()
-    grouped_df = grouped_df.reset_index()
+    rollup_df = get_match_rollup(relayout).query('live == True and player_bucket >= 30')
+    grouped_df = rollup_df.groupby('previous_layer', observed=True)[['count', 'hours']].sum()
+    grouped_df['mean'] = grouped_df['hours'] * 60 / grouped_df['count']
+    # plotly express groups by every category of a categorical column, not just the ones left after filtering,
+    # and the layer categories are in the order the layers were first seen: the ties are sorted by the names
+    grouped_df = grouped_df.reset_index().astype({'previous_layer': str})
     grouped_df['map_name'] = grouped_df['previous_layer'].apply(lambda x: x.split('_')[0])
     grouped_df['neg_count'] = -grouped_df['count']
     grouped_df = grouped_df.sort_values(by=['neg_count', 'previous_layer'])
     frequency_threshold = grouped_df.iloc[5]['count'] if len(grouped_df) >= 6 else 0
     top_entries_df = grouped_df.query('count >= @frequency_threshold')
-    pie_color_map = get_map_color_palette('0')
+    pie_color_map = get_map_color_palette()
     _fig = go.Figure(go.Bar(x=top_entries_df['previous_layer'], y=top_entries_df['count']))
     fig = px.bar(
         top_entries_df,
@@ -147,33 +488,30 @@ def create_frequent_layers(relayout):
 
 @callback(
     Output('first-row-piechart', 'figure'),
-    Output('match-table', 'children'),
-    Input('overall-timeline', 'relayoutData')
+    Input('overall-timeline', 'relayoutData'),
+    Input('live-refresh', 'data'),
 )
+@measure_callback
+@update_on_new_data
+@serve_prerendered
+@cache_by_range([MATCH_TABLE, MATCH_ROLLUP_TABLE])
 def create_piecharts(relayout):
-    df = load_file(MATCH_FILE).query('live == True and mean_player_count >= 40')
-    filtered_df = filter_df_for_timeline(df, relayout)
+    rollup_df = get_match_rollup(relayout).query('live == True and player_bucket >= 40')
 
-    grouped_df = filtered_df[['map_name', 'hours']].groupby('map_name').agg(['count', 'sum', 'mean'])
-    grouped_df.columns = grouped_df.columns.droplevel()
-    grouped_df = grouped_df.reset_index()
+    grouped_df = rollup_df.groupby('map_name', observed=True)[['count', 'hours']].sum()
+    grouped_df['mean'] = grouped_df['hours'] / grouped_df['count']
+    grouped_df = grouped_df.rename(columns={'hours': 'sum'}).reset_index()
     grouped_df['sum'] = grouped_df['sum'].apply(lambda n: round(n, 2))
 
-    version_df = filtered_df[['map_name', 'previous_layer', 'version']] \
-        .groupby(['map_name', 'previous_layer']) \
-        .agg(['count'])
+    version_df = rollup_df.groupby(['map_name', 'previous_layer'], observed=True)['count'].sum()
 
-    version_dict_raw = version_df.to_dict('index')
     version_dict = defaultdict(list)
-    for (map_name, layer), count_dict in version_dict_raw.items():
-        count = count_dict[('version', 'count')]
+    for (map_name, layer), count in version_df.items():
         version_dict[map_name].append(f'{layer}: {count}')
     version_information = ['<br>'.join(sorted(version_dict[map_name])) for map_name in grouped_df['map_name']]
 
-    gamemode_df = filtered_df[['game_mode', 'hours']].groupby('game_mode').agg(['count', 'sum', 'mean'])
-    gamemode_df.columns = gamemode_df.columns.droplevel()
-    gamemode_df = gamemode_df.reset_index()
-    pie_color_map = get_map_color_palette('0')
+    gamemode_df = rollup_df.groupby('game_mode', observed=True)['count'].sum().reset_index()
+    pie_color_map = get_map_color_palette()
     style_data = dict(direction='clockwise',
                       textposition='inside',
                       insidetextorientation='radial',
@@ -227,34 +565,65 @@ def create_piecharts(relayout):
         **style_data
     ), row=1, col=3)
     fig.update_layout(legend=dict(orientation='h'), margin=dict(t=0))
-    pretty_df_for_table = filtered_df.copy()
-    pretty_df_for_table = pretty_df_for_table[
-        ['time', 'previous_layer', 'minutes', 'mean_player_count', 'map_name', 'version']] \
-        .rename({'previous_layer': 'layer', 'mean_player_count': 'players', 'map_name': 'map'}, axis=1)
+    return fig
+
+
+@callback(
+    Output('match-table', 'data'),
+    Output('match-table', 'page_count'),
+    Output('match-table', 'page_current'),
+    Input('match-table', 'page_current'),
+    Input('match-table', 'page_size'),
+    Input('match-table', 'sort_by'),
+    Input('overall-timeline', 'relayoutData'),
+    Input('live-refresh', 'data'),
+)
+@measure_callback
+@update_on_new_data
+def update_match_table(page_current: int, page_size: int, sort_by: list[dict], relayout):
+    """Only the rows of the visible page are sent, sorted and paged here instead of in the browser.
+    The page is moved back to the last one when the selected range got shorter."""
+    filtered_df = filter_df_for_timeline(load_file(MATCH_TABLE), relayout) \
+        .query('live == True and mean_player_count >= 40')
+    page_count = max(math.ceil(len(filtered_df) / page_size), 1)
+    page_current = min(page_current or 0, page_count - 1)
+    columns = [MATCH_TABLE_COLUMNS[sort['column_id']] for sort in sort_by or []] or ['time']
+    ascending = [sort['direction'] == 'asc' for sort in sort_by or []] or [False]
+    # the layer categories are in the order the layers were first seen, see schema.update_layers
+    page_df = filtered_df.sort_values(columns, ascending=ascending, kind='stable', key=sort_key) \
+        .iloc[page_current * page_size:(page_current + 1) * page_size]
+    pretty_df_for_table = page_df[list(MATCH_TABLE_COLUMNS.values())] \
+        .rename(columns={column: name for name, column in MATCH_TABLE_COLUMNS.items()})
+    pretty_df_for_table['time'] = pretty_df_for_table['time'].dt.strftime('%Y-%m-%d %H:%M:%S')
     pretty_df_for_table['minutes'] = pretty_df_for_table['minutes'].apply(lambda m: round(m, 2))
     pretty_df_for_table['players'] = pretty_df_for_table['players'].apply(lambda m: round(m, 1))
-    table = dash_table.DataTable(
-        pretty_df_for_table.sort_values('time', ascending=False).to_dict('records'),
-        [{"name": i, "id": i} for i in pretty_df_for_table.columns],
-        page_size=10,
-        style_table={'overflowX': 'auto', 'minWidth': '0px', 'width': '100%', 'maxWidth': '100%'},
-    )
-    return fig, table
+    return pretty_df_for_table.to_dict('records'), page_count, page_current
+
+
+def sort_key(values: pd.Series) -> pd.Series:
+    """Sorts categoricals by their values instead of the order of their categories."""
+    return values.astype(str) if isinstance(values.dtype, pd.CategoricalDtype) else values
 
 
 @callback(
     Output('overall-timeline', 'figure'),
     Input('load-interval', 'n_intervals'),
+    Input('overall-timeline', 'relayoutData'),
+    Input('live-reload', 'data'),
 )
-def update_timeline(_n_intervals: int):
-    orig_df = load_file(TIMELINE_FILE).rename(
-        columns={'player_count': 'Player count', 'player_change_15_mins': 'Change in 15 mins'}
-    )
+@measure_callback
+@update_on_new_data
+@serve_prerendered
+@cache_by_range(TIMELINE_LEVEL_TABLES)
+def update_timeline(_n_intervals: int, relayout):
+    orig_df = get_timeline_points(relayout)
+    change_columns = {column: f'Change in {column.split("_")[2]} mins'
+                      for column in orig_df.columns if column.startswith('player_change_')}
+    orig_df = orig_df.rename(columns={'player_count': 'Player count', **change_columns})
     df = pd.melt(
         orig_df,
-        id_vars='time', value_vars=['Player count', 'Change in 15 mins'], var_name='type', value_name='value')
-    df['layer'] = orig_df['layer']
-    df['source'] = orig_df['source']
+        id_vars=['time', 'layer', 'source'], value_vars=['Player count', *change_columns.values()], var_name='type',
+        value_name='value')
     fig = px.line(
         df,
         x='time',
@@ -264,7 +633,8 @@ def update_timeline(_n_intervals: int):
         color_discrete_sequence=px.colors.qualitative.T10,
         render_mode='webg1'
     )
-    fig.update_layout(hovermode='x', dragmode='zoom', selectdirection='h')
+    # keeps the zoom of the user when the figure is replaced with the points of the zoomed range
+    fig.update_layout(hovermode='x', dragmode='zoom', selectdirection='h', uirevision='timeline')
     fig.update_xaxes(
         rangeslider=dict(
             visible=True,
@@ -285,10 +655,27 @@ def update_timeline(_n_intervals: int):
     )
     # fig.update_xaxes(range=[datetime.datetime.now() - datetime.timedelta(days=14), datetime.datetime.now()])
     fig.update_yaxes(fixedrange=True)
-    fig.for_each_trace(lambda trace: trace.update(visible="legendonly") if trace.name in {'Change in 15 mins'} else ())
+    fig.for_each_trace(
+        lambda trace: trace.update(visible="legendonly") if trace.name in change_columns.values() else ())
     return fig
 
 
+clientside_callback(
+    ClientsideFunction(namespace='live', function_name='takeUpdate'),
+    Output('live-update', 'data'),
+    Output('live-refresh', 'data'),
+    Output('live-reload', 'data'),
+    Input('live-poll', 'n_intervals'),
+    State('overall-timeline', 'relayoutData'),
+)
+clientside_callback(
+    ClientsideFunction(namespace='live', function_name='extendTimeline'),
+    Output('overall-timeline', 'extendData'),
+    Input('live-update', 'data'),
+    State('overall-timeline', 'figure'),
+)
+
+
 def hour_to_pretty_time(hours: float) -> str:
     full_hours = math.floor(hours)
     minutes = (hours - full_hours) * 60
@@ -297,47 +684,106 @@ def hour_to_pretty_time(hours: float) -> str:
 
 @callback(
     Output('seed-timeline', 'figure'),
-    Output('server-status', 'children'),
-    Input('overall-timeline', 'relayoutData')
+    Input('overall-timeline', 'relayoutData'),
+    Input('live-refresh', 'data'),
 )
+@measure_callback
+@update_on_new_data
+@serve_prerendered
+@cache_by_range([SEED_LIVE_TABLE, EVENT_ROLLUP_TABLE])
 def create_seed_live_charts(relayout):
     interesting_events = {'seed', 'live'}
-    raw_df = load_file(SEED_LIVE_FILE).copy()
-    df = filter_df_for_timeline(raw_df, relayout)
-    server_status = raw_df.iloc[-1]['event']
-    df['pretty_time'] = df['hours'].dropna().apply(hour_to_pretty_time)
-    fig = px.bar(df.query('previous_event in @interesting_events'), x='date', y='hours', color='previous_event',
+    df = get_event_rollup(relayout)
+    df = df[df['previous_event'].isin(interesting_events)]
+    # the hours of the events are rounded to 2 decimals, so are their sums
+    df = df.assign(hours=df['hours'].astype(float).round(2)).astype({'previous_event': str})
+    df['pretty_time'] = df['hours'].apply(hour_to_pretty_time)
+    fig = px.bar(df, x='day', y='hours', color='previous_event',
                  barmode='group',
                  color_discrete_map=EVENT_COLORMAP,
                  title='How long the server is seeding and live daily', text='pretty_time',
-                 labels={'previous_event': 'Event', 'seed': 'Seeding', 'live': 'Live', 'pretty_time': 'Time elapsed'})
+                 labels={'day': 'date', 'previous_event': 'Event', 'seed': 'Seeding', 'live': 'Live',
+                         'pretty_time': 'Time elapsed'})
     fig.update_traces(textposition="inside", cliponaxis=False, textangle=0)
     fig.update_xaxes(tickformat='%d %B (%a)')
-    return fig, server_current_status()
+    return fig
+
+
+@callback(
+    Output('population-patterns', 'figure'),
+    Input('overall-timeline', 'relayoutData'),
+    Input('live-refresh', 'data'),
+)
+@measure_callback
+@update_on_new_data
+@serve_prerendered
+@cache_by_range([TIMELINE_TABLE, SEED_LIVE_TABLE, POPULATION_ROLLUP_TABLE, SEED_CURVE_ROLLUP_TABLE])
+def create_population_charts(relayout):
+    population_df = get_population_rollup(relayout)
+    counts = population_df.groupby(['player_bucket', 'hour_of_week'])['count'].sum().unstack(fill_value=0) \
+        .reindex(columns=range(7 * 24), fill_value=0)
+    # the share of the samples of every hour of the week in each player count bucket
+    shares = counts / counts.sum().where(lambda total: total > 0) * 100
+    curve_df = get_seed_curve_rollup(relayout).groupby('minute')[['seeds', 'count', 'player_sum']].sum()
+    seeds = int(curve_df['seeds'].sum())
 
+    fig = plotly.subplots.make_subplots(
+        1,
+        2,
+        column_widths=[0.65, 0.35],
+        horizontal_spacing=0.08,
+        subplot_titles=['Player count by hour of the week',
+                        f'Average player count after the start of seeding ({seeds} seeds)'],
+    )
+    fig.add_trace(go.Heatmap(
+        name='',
+        x=shares.columns,
+        y=[f'{bucket}-{bucket + rollup.PLAYER_BUCKET_SIZE - 1}' for bucket in shares.index],
+        z=shares.values,
+        colorscale='Viridis',
+        colorbar=dict(title='% of time', x=0.6),
+        hovertemplate='%{y} players for %{z:.1f}% of the time<extra></extra>',
+    ), row=1, col=1)
+    fig.add_trace(go.Scatter(
+        name='',
+        x=curve_df.index,
+        y=curve_df['player_sum'] / curve_df['count'],
+        mode='lines+markers',
+        marker_color=EVENT_COLORMAP['seed'],
+        hovertemplate='%{x} minutes after the start: %{y:.1f} players<extra></extra>',
+    ), row=1, col=2)
+    fig.update_xaxes(tickvals=list(range(0, 7 * 24, 24)), ticktext=['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun'],
+                     title_text='hour of the week', row=1, col=1)
+    fig.update_yaxes(title_text='players', row=1, col=1)
+    fig.update_xaxes(title_text='minutes after the start of seeding', row=1, col=2)
+    fig.update_yaxes(title_text='average players', row=1, col=2)
+    fig.update_layout(showlegend=False)
+    return fig
 
-def server_current_status():
-    server_status = load_file(SEED_LIVE_FILE).iloc[-1]['event']
-    df = load_file(TIMELINE_FILE)
-    player_count, current_layer, change_in_15 = (df.iloc[-1]['player_count'], df.iloc[-1]['layer'],
-                                                 df.iloc[-1]['player_change_15_mins'])
 
-    history_df = df.iloc[-120:].sort_values('time', ascending=False).copy()
-    history_df['time'] = pd.to_datetime(history_df['time'])
-    current_time = history_df.iloc[0]['time']
-    different_layer_timestamp_slice = history_df.query('layer != @current_layer')
-    if len(different_layer_timestamp_slice) == 0:
+@callback(
+    Output('server-status', 'children'),
+    Input('status-interval', 'n_intervals'),
+    Input('live-update', 'data'),
+)
+@measure_callback
+def server_current_status(_n_intervals: int, _update: dict | None):
+    content = read_status()
+    if content is None:
+        return []
+    status = json.loads(content)
+    server_status, player_count, current_layer = status['state'], status['player_count'], status['layer']
+
+    if status['layer_start_time'] is None:
         length_string = 'for a while'
     else:
-        starttime = different_layer_timestamp_slice.iloc[0]['time']
-        time_elapsed_minutes = (current_time - starttime).total_seconds() // 60
-        hours, minutes = divmod(time_elapsed_minutes, 60)
+        time_elapsed = pd.Timestamp(status['time']) - pd.Timestamp(status['layer_start_time'])
+        hours, minutes = divmod(time_elapsed.total_seconds() // 60, 60)
         length_string = f'{hours:.0f}h {minutes:.0f}m'
 
     server_live_in_components = []
-    if server_status == 'seed':
-        players_needed = 60 - player_count
-        server_live_in = (players_needed / change_in_15) * 15
+    if server_status == 'seed' and status['live_in_minutes'] is not None:
+        server_live_in = status['live_in_minutes']
         if 0 < server_live_in < 120:
             server_live_in_components = [
                 html.Span('Server is live in: '),
@@ -361,6 +807,30 @@ def server_current_status():
     ] + server_live_in_components
 
 
+def parse_range_time(value: str, tz: datetime.tzinfo | None) -> pd.Timestamp:
+    # the relayout range is in the timezone of the data, without an offset
+    timestamp = pd.Timestamp(value)
+    return timestamp.tz_localize(tz) if timestamp.tzinfo is None else timestamp
+
+
+def get_selected_range(relayout: dict | None, tz: datetime.tzinfo | None) -> tuple[pd.Timestamp, pd.Timestamp] | None:
+    timeframe = get_timeframe(relayout)
+    if timeframe is None:
+        return None
+    starttime, endtime = sorted(parse_range_time(t, tz) for t in timeframe)
+    return starttime, endtime
+
+
+def snap_relayout(relayout: dict | None) -> dict | None:
+    """The relayout with just the selected range, widened to multiples of RANGE_GRANULARITY."""
+    timeframe = get_timeframe(relayout)
+    if timeframe is None:
+        return None
+    starttime, endtime = sorted(pd.Timestamp(t) for t in timeframe)
+    return {'xaxis.range': [starttime.floor(RANGE_GRANULARITY).isoformat(),
+                            endtime.ceil(RANGE_GRANULARITY).isoformat()]}
+
+
 def get_timeframe(data: dict | None) -> tuple[datetime.time, datetime.time] | None:
     if not data:
         return None
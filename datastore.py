@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from typing import Any, Callable
+
+import pandas as pd
+
+
+class DataStore:
+    """One parsed copy of every table per process, reread only when its file changed.
+
+    A table is `<folder>/<table>.arrow`. The csv exports are never read, they are changed in place while they're
+    written while the Arrow files are replaced whole. Every access stats the file,
+    and `read(path, table)` is only called again when its inode, size or modification time differs,
+    so unchanged tables are never parsed twice. Arrow files are memory-mapped, so the worker processes
+    share their pages through the page cache instead of each holding a copy.
+    Lookups derived from tables are computed once per version of those tables, see `derive`.
+
+    Cache hits take no lock. A reload takes the lock of its table only, so concurrent requests wait for one reload
+    instead of all parsing the same file, and the other tables are served meanwhile.
+    """
+
+    def __init__(self, folder: str, read: Callable[[str, str], pd.DataFrame]):
+        self.folder = folder
+        self.read = read
+        self.generation = 0  # incremented on every (re)load
+        self.counters = {'hits': 0, 'misses': 0, 'reloads': 0, 'derive_hits': 0, 'derive_misses': 0}
+        self._tables: dict[str, tuple[tuple, int, pd.DataFrame]] = {}
+        self._derived: dict[str, tuple[tuple[int, ...], Any]] = {}
+        self._lock = threading.Lock()  # for the dicts and the counters, never held while reading or deriving
+        self._table_locks: dict[str, threading.Lock] = {}
+        self._derive_locks: dict[str, threading.Lock] = {}
+
+    def get(self, table: str) -> pd.DataFrame:
+        return self._get(table)[1]
+
+    def derive(self, name: str, tables: list[str], function: Callable[..., Any]) -> Any:
+        """`function` called with the given tables, cached until any of them is reloaded."""
+        loaded = [self._get(table) for table in tables]
+        generations = tuple(generation for generation, _ in loaded)
+        cached = self._derived.get(name)
+        if cached is not None and cached[0] == generations:
+            self._count('derive_hits')
+            return cached[1]
+        with self._get_lock(self._derive_locks, name):
+            cached = self._derived.get(name)  # derived by another thread while this one waited
+            if cached is not None and cached[0] == generations:
+                self._count('derive_hits')
+                return cached[1]
+            value = function(*(df for _, df in loaded))
+            with self._lock:
+                self.counters['derive_misses'] += 1
+                self._derived[name] = (generations, value)
+            return value
+
+    def versions(self, tables: list[str]) -> tuple[tuple, ...]:
+        """The current versions of the files of the tables. Unlike the generation these are the same in every
+        worker process, so they can key results computed from the tables."""
+        return tuple(self.get_signature(table) for table in tables)
+
+    def tables(self) -> dict[str, pd.DataFrame]:
+        """The tables loaded so far, as they are now in memory."""
+        with self._lock:
+            return {table: df for table, (_, _, df) in self._tables.items()}
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {**self.counters, 'generation': self.generation, 'tables': len(self._tables)}
+
+    def _get(self, table: str) -> tuple[int, pd.DataFrame]:
+        """The generation the table was loaded in and the table."""
+        signature = self.get_signature(table)
+        path = signature[0]
+        cached = self._tables.get(table)  # the entries are replaced whole, never changed in place
+        if cached is not None and cached[0] == signature:
+            self._count('hits')
+            return cached[1], cached[2]
+        with self._get_lock(self._table_locks, table):
+            cached = self._tables.get(table)  # loaded by another thread while this one waited
+            if cached is not None and cached[0] == signature:
+                self._count('hits')
+                return cached[1], cached[2]
+            df = self.read(path, table)
+            with self._lock:
+                self.counters['reloads' if cached is not None else 'misses'] += 1
+                self.generation += 1
+                generation = self.generation
+                self._tables[table] = (signature, generation, df)
+            logging.info(f'Loaded {path} ({len(df)} rows), generation {generation}.')
+            return generation, df
+
+    def _get_lock(self, locks: dict[str, threading.Lock], name: str) -> threading.Lock:
+        with self._lock:
+            return locks.setdefault(name, threading.Lock())
+
+    def _count(self, counter: str):
+        with self._lock:
+            self.counters[counter] += 1
+
+    def get_signature(self, table: str) -> tuple[str, int, int, int]:
+        path = self.find_file(table)
+        stat = os.stat(path)
+        return path, stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def find_file(self, table: str) -> str:
+        return os.path.join(self.folder, f'{table}.arrow')
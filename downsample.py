@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+PYRAMID_LEVELS = (10, 60, 360, 1440)  # bucket sizes in minutes, finest first
+
+
+def get_level_table(table: str, minutes: int) -> str:
+    return f'{table}_{minutes}min'
+
+
+def min_max_rows(timeline_df: pd.DataFrame, minutes: int) -> pd.DataFrame:
+    """The rows with the lowest and the highest player count of every `minutes` long bucket, in time order.
+    Unlike averaging or taking every nth row this keeps the peaks, and the rows stay real samples with their layer."""
+    if len(timeline_df) == 0:
+        return timeline_df
+    buckets = timeline_df['time'].dt.floor(f'{minutes}min').values
+    bucket_starts = np.r_[0, np.flatnonzero(buckets[1:] != buckets[:-1]) + 1]
+    bucket_ids = np.repeat(np.arange(len(bucket_starts)), np.diff(np.r_[bucket_starts, len(buckets)]))
+    player_counts = timeline_df['player_count'].values
+    # the rows are in time order, so sorting by bucket and player count keeps the buckets where they were,
+    # with the first row of the lowest and of the highest player count at the start of each
+    lowest = np.lexsort((player_counts, bucket_ids))[bucket_starts]
+    highest = np.lexsort((-player_counts, bucket_ids))[bucket_starts]
+    return timeline_df.iloc[np.union1d(lowest, highest)]
+
+
+def get_open_bucket(level_df: pd.DataFrame, minutes: int) -> pd.Series:
+    """Mask of the rows of the last bucket, which can still change when new samples come in."""
+    buckets = level_df['time'].dt.floor(f'{minutes}min')
+    return buckets == buckets.iloc[-1] if len(level_df) else pd.Series(False, index=level_df.index)
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+import numpy as np
+
+# events = {'seed', 'live', 'dying', 'dead'}
+EVENTS = ('dead', 'seed', 'live', 'dying')
+DEAD, SEED, LIVE, DYING = range(len(EVENTS))
+STAY = -1
+
+
+@dataclass(frozen=True)
+class EventThresholds:
+    seeding_players: int = 5  # dead -> seed from this many players, live -> dead below it
+    empty_players: int = 2  # seed -> dead at or below this, dying -> dead below it
+    dying_players: int = 50  # live -> dying below this, seed -> live above it when not on a seeding layer
+    live_players: int = 60  # seed -> live above this, dying -> live from this many players
+
+
+DEFAULT_THRESHOLDS = EventThresholds()
+
+
+def get_transitions(player_counts: np.ndarray, seeding_layers: np.ndarray,
+                    thresholds: EventThresholds) -> dict[str, np.ndarray]:
+    """For every state the index of the next state at each sample, or STAY if the sample does not change it."""
+    t = thresholds
+    return {
+        'dead': np.where(player_counts >= t.seeding_players, SEED, STAY),
+        'seed': np.select(
+            [player_counts <= t.empty_players,
+             (player_counts > t.live_players)
+             | ((player_counts > t.dying_players) & ~seeding_layers)],  # mapchanged from seeding to live layer
+            [DEAD, LIVE],
+            STAY),
+        'live': np.select(
+            [player_counts < t.seeding_players, player_counts < t.dying_players],
+            [DEAD, DYING],
+            STAY),
+        'dying': np.select(
+            [player_counts < t.empty_players, player_counts >= t.live_players],
+            [DEAD, LIVE],
+            STAY),
+    }
+
+
+def detect_events(player_counts: np.ndarray, seeding_layers: np.ndarray, state: str = 'dead', start: int = 0,
+                  thresholds: EventThresholds = DEFAULT_THRESHOLDS) -> tuple[list[tuple[int, str]], str, int]:
+    """Runs the seed/live state machine over the samples from `start` on, starting in `state`.
+
+    Returns the (index, event) transitions, the final state and the index to resume from,
+    so a later call with more samples only has to look at the new ones.
+    Instead of stepping through every sample, it jumps to the next sample that changes the current state.
+    """
+    player_counts = np.asarray(player_counts)[start:]
+    seeding_layers = np.asarray(seeding_layers, dtype=bool)[start:]
+    transitions = get_transitions(player_counts, seeding_layers, thresholds)
+    exit_indices = {event: np.flatnonzero(next_states != STAY) for event, next_states in transitions.items()}
+
+    event_log = []
+    i = 0
+    while True:
+        candidates = exit_indices[state]
+        position = np.searchsorted(candidates, i)
+        if position == len(candidates):
+            break
+        i = candidates[position]
+        state = EVENTS[transitions[state][i]]
+        event_log.append((start + int(i), state))
+        i += 1
+    return event_log, state, start + len(player_counts)
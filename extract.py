@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+BATTLEMETRICS = 'Battlemetrics'
+SQUADSERVERS = 'Squad-servers.com'
+
+# patterns on the semicolon separated text of the server info element
+BATTLEMETRICS_PATTERNS = {
+    'player_count': re.compile(r'Player count;(\d+)'),
+    'max_players': re.compile(r'Player count;\d+/(\d+)'),
+    'layer': re.compile(r'Map;(\w+);'),
+    'rank': re.compile(r'Rank;#?([\d,]+)'),
+}
+SQUADSERVERS_PATTERNS = {
+    'player_count': re.compile(r'Players;;(\d+)/'),
+    'max_players': re.compile(r'Players;;\d+/(\d+)'),
+    'layer': re.compile(r'Map;;(\w+)'),
+    'rank': re.compile(r'Rank;;#?([\d,]+)'),
+}
+
+
+@dataclass(frozen=True)
+class ServerInfo:
+    source: str
+    player_count: int | None
+    max_players: int | None
+    layer: str | None
+    rank: str | None
+    text: str  # the semicolon separated text of the server info element, as the raw log always stored it
+
+    def to_row(self, compact: bool = False) -> str:
+        """The raw log entry, either the full legacy text or just the fields the processor reads,
+        in the same format."""
+        if not compact:
+            return self.text
+        players = f'{self.player_count}/{self.max_players}' if self.player_count is not None else ''
+        if self.source == BATTLEMETRICS:
+            return f'Rank;#{self.rank or ""};Player count;{players};Map;{self.layer or ""};'
+        return f';;;Players;;{players};;Map;;{self.layer or ""}'
+
+
+def extract_battlemetrics(html: str) -> ServerInfo | None:
+    element = find_element(html, 'div', 'server-info')
+    if element is None:
+        return None
+    return parse_server_info(BATTLEMETRICS, element.get_text(separator=';'), BATTLEMETRICS_PATTERNS)
+
+
+def extract_squadservers(html: str) -> ServerInfo | None:
+    element = find_element(html, 'table', 'table table-bordered')
+    if element is None:
+        return None
+    text = re.sub(r'\s', '', element.get_text(separator=';'))
+    return parse_server_info(SQUADSERVERS, text, SQUADSERVERS_PATTERNS)
+
+
+def parse_server_info(source: str, text: str, patterns: dict[str, re.Pattern]) -> ServerInfo:
+    fields = {}
+    for field, pattern in patterns.items():
+        match = pattern.search(text)
+        fields[field] = match.group(1) if match else None
+    return ServerInfo(
+        source=source,
+        player_count=int(fields['player_count']) if fields['player_count'] else None,
+        max_players=int(fields['max_players']) if fields['max_players'] else None,
+        layer=fields['layer'],
+        rank=fields['rank'],
+        text=text,
+    )
+
+
+def find_element(html: str, tag: str, css_class: str):
+    """Finds the first `tag` with the class `css_class` like `soup.find(tag, {'class': css_class})`,
+    but only parses that element: its HTML is cut out of the page first, so the rest of the page is never parsed.
+    Falls back to parsing the page with a strainer if the element can't be cut out."""
+    fragment = cut_fragment(html, tag, css_class)
+    if fragment is not None:
+        element = BeautifulSoup(fragment, features='html.parser').find(tag, {'class': css_class})
+        if element is not None:
+            return element
+    soup = BeautifulSoup(html, features='html.parser', parse_only=SoupStrainer(tag, {'class': css_class}))
+    return soup.find(tag, {'class': css_class})
+
+
+def cut_fragment(html: str, tag: str, css_class: str) -> str | None:
+    if ' ' in css_class:
+        class_pattern = re.escape(css_class)
+    else:  # a single class can be one of several in the attribute
+        class_pattern = rf'[^"\']*(?<![\w-]){re.escape(css_class)}(?![\w-])[^"\']*'
+    start = re.search(rf'<{tag}\b[^>]*\bclass=["\']{class_pattern}["\']', html, flags=re.IGNORECASE)
+    if start is None:
+        return None
+    depth = 0
+    for tag_match in re.compile(rf'<(/?){tag}\b', flags=re.IGNORECASE).finditer(html, start.start()):
+        depth += -1 if tag_match.group(1) else 1
+        if depth == 0:
+            end = html.find('>', tag_match.end())
+            return html[start.start():end + 1] if end != -1 else None
+    return None
@@ -0,0 +1,10 @@
+# gunicorn --config gunicorn.conf.py dashboard:server
+# Every open dashboard holds a thread for its update stream (/squad-dashboard/api/updates) as long as the page is
+# open, so the workers are threaded: a sync worker would be taken by a single viewer. The caches are per worker,
+# few workers with many threads share them best.
+import os
+
+bind = os.environ.get('SQUAD_DASHBOARD_BIND', '127.0.0.1:8050')
+worker_class = 'gthread'
+workers = int(os.environ.get('SQUAD_DASHBOARD_WORKERS', 2))
+threads = int(os.environ.get('SQUAD_DASHBOARD_THREADS', 64))  # open dashboards plus their callbacks, per worker
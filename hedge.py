@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable
+
+
+class SourceHistory:
+    """Moving averages of the latency and the error rate of every (server, source) pair."""
+
+    def __init__(self, smoothing: float = 0.2):
+        self.smoothing = smoothing
+        self.latency: dict[tuple[str, str], float] = {}
+        self.error_rate: dict[tuple[str, str], float] = {}
+        self._lock = threading.Lock()
+
+    def record(self, server: str, source: str, latency: float, ok: bool):
+        key = (server, source)
+        with self._lock:
+            if key not in self.latency:
+                self.latency[key], self.error_rate[key] = latency, float(not ok)
+                return
+            self.latency[key] += self.smoothing * (latency - self.latency[key])
+            self.error_rate[key] += self.smoothing * (float(not ok) - self.error_rate[key])
+
+    def expected_time(self, server: str, source: str) -> float:
+        """Expected time until a valid answer, sources without history come first so they get measured."""
+        key = (server, source)
+        with self._lock:
+            if key not in self.latency:
+                return 0
+            return self.latency[key] / max(1 - self.error_rate[key], 0.05)
+
+    def ranked(self, server: str, sources: list[str]) -> list[str]:
+        return sorted(sources, key=lambda source: self.expected_time(server, source))
+
+
+class HedgedFetcher:
+    """Queries the sources of a server in order of their expected time to a valid answer.
+
+    The next source is only started when the ones already running failed or did not answer within `delay` seconds,
+    so in steady state every sample costs one request. With `delay=0` all sources are queried at the same time.
+    """
+
+    def __init__(self, delay: float, is_valid: Callable[[str], bool], max_workers: int = 16):
+        self.delay = delay
+        self.is_valid = is_valid
+        self.history = SourceHistory()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def fetch(self, server: str, fetchers: dict[str, Callable[[], str]]) -> str:
+        """The first valid answer. Without one, the last invalid answer, or the last exception if every source
+        raised one. A source that raises counts as failed, the next one is started."""
+        if not fetchers:
+            raise ValueError(f'[{server}] No sources to query.')
+        remaining = self.history.ranked(server, list(fetchers))
+        running: dict[Future, str] = {}
+        result = None
+        error = None
+        while remaining or running:
+            if remaining:
+                source = remaining.pop(0)
+                running[self.executor.submit(self._timed_fetch, server, source, fetchers[source])] = source
+            done, _ = wait(running, timeout=self.delay if remaining else None, return_when=FIRST_COMPLETED)
+            for future in done:
+                source = running.pop(future)
+                try:
+                    result = future.result()
+                except Exception as exception:
+                    logging.warning(f'[{server}] {source} failed: {exception!r}')
+                    error = exception
+                    continue
+                if self.is_valid(result):
+                    logging.info(f'[{server}] Answer from {source}.')
+                    return result
+        if result is None:
+            raise error
+        return result
+
+    def _timed_fetch(self, server: str, source: str, fetcher: Callable[[], str]) -> str:
+        starttime = time.perf_counter()
+        try:
+            result = fetcher()
+        except Exception:
+            self.history.record(server, source, time.perf_counter() - starttime, False)
+            raise
+        self.history.record(server, source, time.perf_counter() - starttime, self.is_valid(result))
+        return result
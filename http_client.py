@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass
+
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# error codes, written to the raw log as ERROR:<code>
+TIMEOUT = 'timeout'
+CONNECTION_ERROR = 'connection_error'
+REQUEST_ERROR = 'request_error'
+
+
+@dataclass
+class FetchResult:
+    url: str
+    text: str | None
+    status: int | None
+    error: str | None
+    latency: float
+    retries: int
+    not_modified: bool = False
+
+
+class HttpClient:
+    """A shared HTTP client: keep-alive connection pooling, connect and read timeouts,
+    retries with exponential backoff and full jitter, and conditional requests.
+
+    When a page was fetched before, its ETag and Last-Modified are sent back. On 304 Not Modified
+    the previous body is returned, so callers don't have to care about it.
+    """
+
+    def __init__(self, connect_timeout: float = 5, read_timeout: float = 20, max_retries: int = 3,
+                 backoff_base: float = 1, backoff_max: float = 10, pool_size: int = 10):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._validators: dict[str, tuple[str | None, str | None, str]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, url: str) -> FetchResult:
+        starttime = time.perf_counter()
+        retries = 0
+        while True:
+            result = self._get_once(url, starttime, retries)
+            retryable = result.error in {TIMEOUT, CONNECTION_ERROR} or result.status in RETRY_STATUSES
+            if not retryable or retries >= self.max_retries:
+                break
+            time.sleep(self.get_backoff(retries))
+            retries += 1
+        result.latency = time.perf_counter() - starttime
+        logging.info(f'GET {url}: {result.error or result.status} in {result.latency:.2f} seconds, '
+                     f'{retries} retries.')
+        return result
+
+    def get_backoff(self, retries: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** retries))
+
+    def _get_once(self, url: str, starttime: float, retries: int) -> FetchResult:
+        with self._lock:
+            etag, last_modified, previous_text = self._validators.get(url, (None, None, None))
+        headers = {}
+        if etag is not None:
+            headers['If-None-Match'] = etag
+        if last_modified is not None:
+            headers['If-Modified-Since'] = last_modified
+
+        def failed(error: str, status: int | None = None) -> FetchResult:
+            return FetchResult(url, None, status, error, time.perf_counter() - starttime, retries)
+
+        try:
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+        except requests.Timeout:
+            return failed(TIMEOUT)
+        except requests.ConnectionError:
+            return failed(CONNECTION_ERROR)
+        except requests.RequestException:
+            return failed(REQUEST_ERROR)
+
+        if response.status_code == 304 and previous_text is not None:
+            return FetchResult(url, previous_text, 304, None, time.perf_counter() - starttime, retries,
+                               not_modified=True)
+        if response.status_code != 200:
+            return failed(f'http_{response.status_code}', response.status_code)
+        etag, last_modified = response.headers.get('ETag'), response.headers.get('Last-Modified')
+        if etag is not None or last_modified is not None:
+            with self._lock:
+                self._validators[url] = (etag, last_modified, response.text)
+        return FetchResult(url, response.text, 200, None, time.perf_counter() - starttime, retries)
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+METRICS_FILE = 'metrics_{component}.json'  # in the log folder, written by the poller and the processor
+
+
+class Metrics:
+    """Counters, gauges and summaries (count, sum and max) of one component, in the Prometheus text format.
+
+    The poller and the processor save a snapshot to their log folder after every run,
+    the dashboard serves those together with its own on /metrics.
+    """
+
+    def __init__(self, component: str):
+        self.component = component
+        self._values: dict[tuple[str, str, tuple], float | list[float]] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = ('counter', name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels):
+        with self._lock:
+            self._values[('gauge', name, tuple(sorted(labels.items())))] = value
+
+    def observe(self, name: str, value: float, **labels):
+        key = ('summary', name, tuple(sorted(labels.items())))
+        with self._lock:
+            count, total, maximum = self._values.get(key, (0, 0, value))
+            self._values[key] = [count + 1, total + value, max(maximum, value)]
+
+    @contextmanager
+    def time(self, name: str, **labels):
+        """Observes the seconds the block took, also when it raised."""
+        starttime = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - starttime, **labels)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {'component': self.component, 'time': time.time(),
+                    'metrics': [[kind, name, dict(labels), value]
+                                for (kind, name, labels), value in self._values.items()]}
+
+    def save(self, log_folder: str):
+        path = os.path.join(log_folder, METRICS_FILE.format(component=self.component))
+        with open(path + '.tmp', 'w', encoding='utf-8') as outfile:
+            json.dump(self.snapshot(), outfile)
+        os.replace(path + '.tmp', path)
+
+
+def load_snapshot(log_folder: str, component: str) -> dict | None:
+    try:
+        with open(os.path.join(log_folder, METRICS_FILE.format(component=component)), encoding='utf-8') as infile:
+            return json.load(infile)
+    except FileNotFoundError:
+        return None
+
+
+def render(snapshots: list[dict]) -> str:
+    """The metrics of the snapshots in the Prometheus text exposition format, named squad_<component>_<name>."""
+    samples: dict[str, tuple[str, list[str]]] = {}
+    for snapshot in snapshots:
+        for kind, name, labels, value in snapshot['metrics']:
+            name = f'squad_{snapshot["component"]}_{name}'
+            label_text = format_labels(labels)
+            if kind == 'summary':
+                count, total, maximum = value
+                samples.setdefault(name, ('summary', []))[1].extend(
+                    [f'{name}_count{label_text} {count}', f'{name}_sum{label_text} {total!r}'])
+                samples.setdefault(f'{name}_max', ('gauge', []))[1].append(f'{name}_max{label_text} {maximum!r}')
+            else:
+                samples.setdefault(name, (kind, []))[1].append(f'{name}{label_text} {value!r}')
+    lines = []
+    for name, (kind, metric_lines) in samples.items():
+        lines.append(f'# TYPE {name} {kind}')
+        lines.extend(metric_lines)
+    return '\n'.join(lines) + '\n'
+
+
+def format_labels(labels: dict) -> str:
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in labels.values())
+    return '{' + ','.join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + '}'
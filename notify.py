@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import logging
+import os
+import select
+import socket
+import time
+
+NOTIFY_SOCKET = 'notify.sock'  # in the log folder, the processor of the folder listens on it
+
+
+def notify(log_folder: str):
+    """Tells the processor of `log_folder` that new rows were written. Does nothing if no processor is listening."""
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.setblocking(False)
+            sock.sendto(b'1', os.path.join(log_folder, NOTIFY_SOCKET))
+    except OSError:  # no listener, or its queue is full: it has a notification waiting already
+        pass
+
+
+class Listener:
+    """Waits for the notifications of the poller on a datagram socket, without using any CPU while idle.
+    Where Unix sockets are not available it falls back to waiting for the timeout."""
+
+    def __init__(self, log_folder: str):
+        self.sock = None
+        path = os.path.join(log_folder, NOTIFY_SOCKET)
+        try:
+            if os.path.exists(path):  # left behind by a previous processor
+                os.remove(path)
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self.sock.bind(path)
+        except (OSError, AttributeError) as error:
+            logging.warning(f'Could not listen for new rows on {path} ({error}), processing every timeout instead.')
+            self.sock = None
+
+    def wait(self, timeout: float) -> bool:
+        """Waits until the next notification or until `timeout` seconds pass, returns whether it was notified."""
+        if self.sock is None:
+            time.sleep(timeout)
+            return False
+        readable, _, _ = select.select([self.sock], [], [], timeout)
+        if readable:
+            self.sock.recv(16)
+        return bool(readable)
+
+    def debounce(self, quiet_time: float, max_wait: float):
+        """Swallows the notifications that follow within `quiet_time` seconds of each other, for at most `max_wait`
+        seconds, so a burst of rows is processed together."""
+        deadline = time.monotonic() + max_wait
+        while self.wait(min(quiet_time, max(deadline - time.monotonic(), 0))):
+            if time.monotonic() >= deadline:
+                break
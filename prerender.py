@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import json
+import os
+from inspect import unwrap
+
+import plotly.utils
+
+import dashboard
+from datastore import DataStore
+from schema import PRERENDERED_FILE
+
+# the figures of the default view (no range selected) by callback name, built without the caches of the dashboard
+DEFAULT_FIGURES = {
+    'update_timeline': lambda: unwrap(dashboard.update_timeline)(0, None),
+    'create_piecharts': lambda: unwrap(dashboard.create_piecharts)(None),
+    'create_frequent_layers': lambda: unwrap(dashboard.create_frequent_layers)(None),
+    'create_seed_live_charts': lambda: unwrap(dashboard.create_seed_live_charts)(None),
+    'create_population_charts': lambda: unwrap(dashboard.create_population_charts)(None),
+}
+
+
+def prerender(log_folder: str, generation: int):
+    """Renders the figures of the default view once per data generation, so the dashboard workers don't all build
+    them again after every processor run. The dashboard serves them while `generation` is the current one."""
+    if dashboard.data_store.folder != log_folder:
+        # the callbacks read the tables through the data store of the dashboard module
+        dashboard.data_store = DataStore(log_folder, dashboard.read_file)
+    figures = {name: render() for name, render in DEFAULT_FIGURES.items()}
+    path = os.path.join(log_folder, PRERENDERED_FILE)
+    # json.dump would skip PlotlyJSONEncoder.encode, which writes NaN as null
+    content = json.dumps({'generation': generation, 'figures': figures}, cls=plotly.utils.PlotlyJSONEncoder)
+    with open(path + '.tmp', 'w', encoding='utf-8') as outfile:
+        outfile.write(content)
+    os.replace(path + '.tmp', path)
@@ -1,4 +1,5 @@
 import argparse
+import json
 import logging
 import os
 import re
@@ -7,176 +8,588 @@ from functools import lru_cache
 
 import numpy as np
 import pandas as pd
-import schedule
+
+import notify
+import raw_log
+import rollup
+import storage
+from downsample import PYRAMID_LEVELS, get_level_table, get_open_bucket, min_max_rows
+from events import DEFAULT_THRESHOLDS, EventThresholds, detect_events
+from extract import BATTLEMETRICS_PATTERNS, SQUADSERVERS_PATTERNS
+from metrics import Metrics
+from schema import (EVENT_ROLLUP_TABLE, GENERATION_FILE, MATCH_ROLLUP_TABLE, MATCH_TABLE, POPULATION_ROLLUP_TABLE,
+                    SEED_CURVE_ROLLUP_TABLE, SEED_LIVE_TABLE, STATUS_FILE, TIMELINE_TABLE, update_layers)
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+ROLLUP_KEYS = {
+    MATCH_ROLLUP_TABLE: (rollup.MATCH_KEYS, rollup.MATCH_MEASURES),
+    EVENT_ROLLUP_TABLE: (rollup.EVENT_KEYS, rollup.EVENT_MEASURES),
+    POPULATION_ROLLUP_TABLE: (rollup.POPULATION_KEYS, rollup.POPULATION_MEASURES),
+    SEED_CURVE_ROLLUP_TABLE: (rollup.SEED_CURVE_KEYS, rollup.SEED_CURVE_MEASURES),
+}
+OUTPUT_FORMATS = ('arrow',)  # and 'csv' for an export, the tables are written as <table>.<format>
+CHECKPOINT_FILE = 'process_checkpoint.json'
+CHECKPOINT_VERSION = 8
+PLAYER_CHANGE_WINDOWS = (15,)  # minutes, one player_change_<n>_mins column each
+LIVE_PREDICTION_WINDOW = 15  # minutes, the player change the time until the server is live is predicted from
+
+metrics = Metrics('processor')  # saved to the log folder after every run
+
 
 def parse_args():
     parser = argparse.ArgumentParser(description='My Application')
     parser.add_argument('--log_folder', type=str, help='Folder for logging', default='./data')
+    parser.add_argument('--rebuild', action='store_true', help='Ignore the checkpoint and reprocess the full raw log')
+    parser.add_argument('--player_change_windows', type=int, nargs='+', help='Player change windows in minutes',
+                        default=list(PLAYER_CHANGE_WINDOWS))
+    parser.add_argument('--output_formats', type=str, nargs='+', choices=['arrow', 'csv'],
+                        help='Formats to write the processed tables in. arrow is always written, the dashboard '
+                             'reads it. csv is an export, it is changed in place', default=list(OUTPUT_FORMATS))
+    parser.add_argument('--debounce', type=float, default=2,
+                        help='Seconds to wait for more rows after the poller announced new ones')
+    parser.add_argument('--max_delay', type=float, default=10,
+                        help='Longest time in seconds to keep waiting for more rows before processing')
+    parser.add_argument('--idle_timeout', type=float, default=300,
+                        help='Check the raw log after this many seconds without an announcement anyway')
+    parser.add_argument('--no_prerender', action='store_true',
+                        help='Do not render the figures of the default dashboard view after every run')
 
     args = parser.parse_args()
     return args
 
 
-def process(log_folder: str):
+def process(log_folder: str, rebuild: bool = False, player_change_windows: tuple[int, ...] = PLAYER_CHANGE_WINDOWS,
+            output_formats: tuple[str, ...] = OUTPUT_FORMATS, prerender_figures: bool = True):
     starttime = time.time()
-    raw_data_with_errors = pd.read_csv(os.path.join(log_folder, 'raw_query_log.csv'), names=['time', 'data'])
-    timeline_data = create_timeline(raw_data_with_errors)
-    timeline_data.to_csv(os.path.join(log_folder, 'processed_timeline.csv'), index=False)
-    match_data = create_match_data(timeline_data)
-    match_data.to_csv(os.path.join(log_folder, 'match_info.csv'), index=False)
-    event_data = create_event_log(timeline_data)
-    event_data.to_csv((os.path.join(log_folder, 'seed_live_info.csv')), index=False)
+    player_change_windows = tuple(player_change_windows)
+    output_formats = get_output_formats(output_formats)
+    checkpoint = None if rebuild else load_checkpoint(log_folder)
+    if checkpoint is not None and (tuple(checkpoint['player_change_windows']) != player_change_windows
+                                   or tuple(checkpoint['output_formats']) != output_formats
+                                   or tuple(checkpoint['pyramid_levels']) != PYRAMID_LEVELS):
+        logging.info('Settings changed since the checkpoint, rebuilding.')
+        checkpoint = None
+    if checkpoint is None:
+        processed_rows = process_full(log_folder, player_change_windows, output_formats)
+    else:
+        processed_rows = process_incremental(log_folder, checkpoint)
+    if processed_rows > 0:
+        generation = publish_generation(log_folder)
+        if prerender_figures:
+            prerender_default_figures(log_folder, generation)
     endtime = time.time()
-    logging.info(f'Job took {endtime - starttime:.2f} seconds.')
+    mode = 'full' if checkpoint is None else 'incremental'
+    logging.info(f'Job took {endtime - starttime:.2f} seconds ({mode}, {processed_rows} new rows).')
+    metrics.observe('run_seconds', endtime - starttime, mode=mode)
+    metrics.inc('rows_total', processed_rows)
+    metrics.set('last_run_timestamp_seconds', endtime)
+    metrics.save(log_folder)
     return True
 
 
-def create_event_log(timeline_df: pd.DataFrame) -> pd.DataFrame:
-    df = timeline_df.copy()
-    player_count_log = df['player_count'].values
-    layer_log = df['layer'].values
-    # events = {'seed', 'live', 'dying', 'dead'}
-    event_log = [(0, 'dead')]
-    event_happening = False
-    current_event = 'dead'
-    for i, (player_count, layer) in enumerate(zip(player_count_log, layer_log)):
-        is_seeding_layer = 'seed' in layer.lower()
-        if current_event == 'dead':
-            if player_count < 5:
-                continue
-            elif player_count >= 5:
-                current_event = 'seed'
-                event_happening = True
-        elif current_event == 'seed':
-            if player_count <= 2:
-                current_event = 'dead'
-                event_happening = True
-            elif 2 < player_count <= 50:
-                continue
-            elif 50 < player_count <= 60 and not is_seeding_layer:  # mapchanged from seeding to live layer
-                current_event = 'live'
-                event_happening = True
-            elif player_count > 60:
-                current_event = 'live'
-                event_happening = True
-        elif current_event == 'live':
-            if player_count < 5:
-                current_event = 'dead'
-                event_happening = True
-            elif player_count < 50:
-                current_event = 'dying'
-                event_happening = True
-            elif player_count >= 50:
-                pass
-        elif current_event == 'dying':
-            if player_count < 2:
-                current_event = 'dead'
-                event_happening = True
-            elif 2 <= player_count < 60:
-                pass
-            elif player_count >= 60:
-                current_event = 'live'
-                event_happening = True
-        if event_happening:
-            event_log.append((i, current_event))
-            event_happening = False
+def prerender_default_figures(log_folder: str, generation: int):
+    """The dashboard builds the figures itself until they are there, so a failure here only costs time."""
+    try:
+        # imported here, the dashboard module builds the whole app on import
+        import prerender
+        with metrics.time('stage_seconds', stage='prerender'):
+            prerender.prerender(log_folder, generation)
+    except Exception:
+        logging.exception('Could not prerender the default figures.')
+
+
+def publish_generation(log_folder: str) -> int:
+    """Increments the generation marker, consumers can reload when it changes."""
+    path = os.path.join(log_folder, GENERATION_FILE)
+    generation = 0
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as infile:
+            generation = int(infile.read() or 0)
+    with open(path + '.tmp', 'w', encoding='utf-8') as outfile:
+        outfile.write(str(generation + 1))
+    os.replace(path + '.tmp', path)
+    return generation + 1
+
+
+def get_output_formats(output_formats: tuple[str, ...]) -> tuple[str, ...]:
+    """The formats to write, always with arrow. The dashboard reads only arrow files: they are replaced whole,
+    while the csv files are appended to and cut back in place, so a reader could see a partial one."""
+    return tuple(sorted({'arrow', *output_formats}))
+
+
+def process_full(log_folder: str, player_change_windows: tuple[int, ...], output_formats: tuple[str, ...]) -> int:
+    with metrics.time('stage_seconds', stage='read_raw_log'):
+        raw_data_with_errors, raw_position = raw_log.read_raw_log(log_folder)
+    metrics.set('stage_rows', len(raw_data_with_errors), stage='read_raw_log')
+    with metrics.time('stage_seconds', stage='parse_timeline'):
+        timeline_data = parse_timeline(raw_data_with_errors)
+    metrics.set('stage_rows', len(timeline_data), stage='parse_timeline')
+    with metrics.time('stage_seconds', stage='add_player_change'):
+        timeline_data = add_player_change(timeline_data, player_change_windows)
+    return write_full(log_folder, timeline_data, raw_position, player_change_windows, output_formats)
+
+
+def write_full(log_folder: str, timeline_data: pd.DataFrame, raw_position: dict | None,
+               player_change_windows: tuple[int, ...], output_formats: tuple[str, ...]) -> int:
+    """Writes every output and the checkpoint from the timeline of the whole raw log up to `raw_position`."""
+    if len(timeline_data) == 0:
+        logging.info('No valid rows in the raw log yet.')
+        return 0
+    with metrics.time('stage_seconds', stage='write_timeline'):
+        output_sizes = write_output(log_folder, TIMELINE_TABLE, timeline_data, output_formats)
+        pyramid_sizes, open_buckets = write_pyramid(log_folder, timeline_data, output_formats)
+        output_sizes.update(pyramid_sizes)
+    with metrics.time('stage_seconds', stage='create_match_data'):
+        match_data = create_match_data(timeline_data)
+    metrics.set('stage_rows', len(match_data), stage='create_match_data')
+    output_sizes.update(write_output(log_folder, MATCH_TABLE, match_data, output_formats))
+    with metrics.time('stage_seconds', stage='create_event_log'):
+        event_data = create_event_log(timeline_data)
+    metrics.set('stage_rows', len(event_data), stage='create_event_log')
+    current_event = event_data.iloc[-1]['event']
+    has_provisional_event = current_event in {'live', 'seed'}
+    confirmed_event_data = event_data.iloc[:-1] if has_provisional_event else event_data
+    output_sizes.update(write_output(log_folder, SEED_LIVE_TABLE, event_data, output_formats,
+                                     provisional_rows=int(has_provisional_event)))
+
+    with metrics.time('stage_seconds', stage='rollup'):
+        match_rollup_sizes, open_match_rollup = write_rollup(
+            log_folder, MATCH_ROLLUP_TABLE, rollup.rollup_matches(match_data), output_formats)
+        output_sizes.update(match_rollup_sizes)
+        event_rollup_sizes, open_event_rollup = write_rollup(
+            log_folder, EVENT_ROLLUP_TABLE, rollup.rollup_events(confirmed_event_data), output_formats,
+            provisional=rollup.rollup_events(event_data.iloc[len(confirmed_event_data):]))
+        output_sizes.update(event_rollup_sizes)
+        population_rollup_sizes, open_population_rollup = write_rollup(
+            log_folder, POPULATION_ROLLUP_TABLE, rollup.rollup_population(timeline_data), output_formats)
+        output_sizes.update(population_rollup_sizes)
+        seed_starts = rollup.get_seed_starts(confirmed_event_data)
+        seed_curve_rollup_sizes, open_seed_curve_rollup = write_rollup(
+            log_folder, SEED_CURVE_ROLLUP_TABLE, rollup.rollup_seed_curves(timeline_data, seed_starts), output_formats)
+        output_sizes.update(seed_curve_rollup_sizes)
+
+    save_checkpoint(log_folder, {
+        'version': CHECKPOINT_VERSION,
+        'raw_position': raw_position,
+        'player_change_windows': player_change_windows,
+        'output_formats': output_formats,
+        'pyramid_levels': PYRAMID_LEVELS,
+        'tail': timeline_to_records(get_timeline_tail(timeline_data, max(player_change_windows))),
+        'open_buckets': open_buckets,
+        'event_state': {
+            'current_event': current_event,
+            'last_event': confirmed_event_data.iloc[-1]['event'],
+            'last_event_time': confirmed_event_data.iloc[-1]['time'].isoformat(),
+            'last_seed_start': seed_starts.iloc[-1].isoformat() if len(seed_starts) else None,
+        },
+        'open_rollups': {
+            MATCH_ROLLUP_TABLE: timeline_to_records(open_match_rollup, 'day'),
+            EVENT_ROLLUP_TABLE: timeline_to_records(open_event_rollup, 'day'),
+            POPULATION_ROLLUP_TABLE: timeline_to_records(open_population_rollup, 'week'),
+            SEED_CURVE_ROLLUP_TABLE: timeline_to_records(open_seed_curve_rollup, 'week'),
+        },
+        'output_sizes': output_sizes,
+    })
+    write_json(os.path.join(log_folder, STATUS_FILE),
+               create_status(timeline_data, current_event, player_change_windows))
+    return len(timeline_data)
+
+
+def process_incremental(log_folder: str, checkpoint: dict) -> int:
+    player_change_windows = tuple(checkpoint['player_change_windows'])
+    output_formats = tuple(checkpoint['output_formats'])
+    if not raw_log.is_valid_position(log_folder, checkpoint['raw_position']):
+        logging.info('Raw log does not match the checkpoint, rebuilding.')
+        return process_full(log_folder, player_change_windows, output_formats)
+
+    with metrics.time('stage_seconds', stage='read_raw_log'):
+        raw_data_with_errors, raw_position = raw_log.read_raw_log(log_folder, checkpoint['raw_position'])
+    metrics.set('stage_rows', len(raw_data_with_errors), stage='read_raw_log')
+    with metrics.time('stage_seconds', stage='parse_timeline'):
+        new_timeline = parse_timeline(raw_data_with_errors)
+    metrics.set('stage_rows', len(new_timeline), stage='parse_timeline')
+    checkpoint['raw_position'] = raw_position
+    if len(new_timeline) == 0:  # leave the outputs alone, their provisional rows are still current
+        save_checkpoint(log_folder, checkpoint)
+        return 0
+    if not restore_output_sizes(log_folder, checkpoint):
+        logging.info('Outputs do not match the checkpoint, rebuilding.')
+        return process_full(log_folder, player_change_windows, output_formats)
+
+    tail = records_to_timeline(checkpoint['tail'])
+    player_change_columns = [get_player_change_column(window) for window in player_change_windows]
+    combined = pd.concat([tail.drop(columns=player_change_columns), new_timeline], ignore_index=True)
+    with metrics.time('stage_seconds', stage='add_player_change'):
+        combined = add_player_change(combined, player_change_windows)
+    new_timeline = combined.iloc[len(tail):]
+    output_sizes = checkpoint['output_sizes']
+    with metrics.time('stage_seconds', stage='write_timeline'):
+        output_sizes.update(write_output(log_folder, TIMELINE_TABLE, new_timeline, output_formats, output_sizes))
+        pyramid_sizes, checkpoint['open_buckets'] = write_pyramid(log_folder, new_timeline, output_formats,
+                                                                  output_sizes, checkpoint['open_buckets'])
+        output_sizes.update(pyramid_sizes)
+
+    # matches whose layer change happened in the tail are already written
+    with metrics.time('stage_seconds', stage='create_match_data'):
+        match_data = create_match_data(combined)
+        match_data = match_data[match_data.index >= len(tail)]
+    metrics.set('stage_rows', len(match_data), stage='create_match_data')
+    output_sizes.update(write_output(log_folder, MATCH_TABLE, match_data, output_formats, output_sizes))
+
+    open_rollups = checkpoint['open_rollups']
+    match_rollup_sizes, open_match_rollup = write_rollup(
+        log_folder, MATCH_ROLLUP_TABLE, rollup.rollup_matches(match_data), output_formats, output_sizes,
+        records_to_timeline(open_rollups[MATCH_ROLLUP_TABLE], 'day'))
+    output_sizes.update(match_rollup_sizes)
+    open_rollups[MATCH_ROLLUP_TABLE] = timeline_to_records(open_match_rollup, 'day')
+    population_rollup_sizes, open_population_rollup = write_rollup(
+        log_folder, POPULATION_ROLLUP_TABLE, rollup.rollup_population(new_timeline), output_formats, output_sizes,
+        records_to_timeline(open_rollups[POPULATION_ROLLUP_TABLE], 'week'))
+    output_sizes.update(population_rollup_sizes)
+    open_rollups[POPULATION_ROLLUP_TABLE] = timeline_to_records(open_population_rollup, 'week')
+
+    event_state = checkpoint['event_state']
+    with metrics.time('stage_seconds', stage='create_event_log'):
+        event_log, current_event, _ = detect_events(
+            combined['player_count'].values, combined['seeding'].values, event_state['current_event'],
+            start=len(tail))
+    metrics.set('stage_rows', len(event_log), stage='create_event_log')
+    has_provisional_event = current_event in {'live', 'seed'}
+    if has_provisional_event:
+        event_log.append((len(combined) - 1, current_event))
+    confirmed_event_rollup = provisional_event_rollup = None
+    # the samples of the new rows continue the curve of the last seed, or start the curves of new ones
+    seed_starts = combined['time'].iloc[:0] if event_state['last_seed_start'] is None \
+        else pd.Series([pd.Timestamp(event_state['last_seed_start'])])
+    if event_log:
+        last_event = (event_state['last_event'], pd.Timestamp(event_state['last_event_time']))
+        event_data = build_event_frame(combined['time'], event_log, last_event)
+        output_sizes.update(write_output(log_folder, SEED_LIVE_TABLE, event_data, output_formats, output_sizes,
+                                         provisional_rows=int(has_provisional_event)))
+        confirmed_event_data = event_data.iloc[:-1] if has_provisional_event else event_data
+        if len(confirmed_event_data) > 0:
+            event_state['last_event'] = confirmed_event_data.iloc[-1]['event']
+            event_state['last_event_time'] = confirmed_event_data.iloc[-1]['time'].isoformat()
+        confirmed_event_rollup = rollup.rollup_events(confirmed_event_data)
+        provisional_event_rollup = rollup.rollup_events(event_data.iloc[len(confirmed_event_data):])
+        seed_starts = pd.concat([seed_starts, rollup.get_seed_starts(confirmed_event_data)], ignore_index=True)
+        if len(seed_starts) > 0:
+            event_state['last_seed_start'] = seed_starts.iloc[-1].isoformat()
+    event_state['current_event'] = current_event
+    event_rollup_sizes, open_event_rollup = write_rollup(
+        log_folder, EVENT_ROLLUP_TABLE, confirmed_event_rollup, output_formats, output_sizes,
+        records_to_timeline(open_rollups[EVENT_ROLLUP_TABLE], 'day'), provisional_event_rollup)
+    output_sizes.update(event_rollup_sizes)
+    open_rollups[EVENT_ROLLUP_TABLE] = timeline_to_records(open_event_rollup, 'day')
+    seed_curve_rollup_sizes, open_seed_curve_rollup = write_rollup(
+        log_folder, SEED_CURVE_ROLLUP_TABLE, rollup.rollup_seed_curves(new_timeline, seed_starts), output_formats,
+        output_sizes, records_to_timeline(open_rollups[SEED_CURVE_ROLLUP_TABLE], 'week'))
+    output_sizes.update(seed_curve_rollup_sizes)
+    open_rollups[SEED_CURVE_ROLLUP_TABLE] = timeline_to_records(open_seed_curve_rollup, 'week')
+    checkpoint['tail'] = timeline_to_records(get_timeline_tail(combined, max(player_change_windows)))
+    save_checkpoint(log_folder, checkpoint)
+    write_json(os.path.join(log_folder, STATUS_FILE), create_status(combined, current_event, player_change_windows))
+    return len(new_timeline)
+
+
+def write_output(log_folder: str, table: str, df: pd.DataFrame, output_formats: tuple[str, ...],
+                 restore_sizes: dict[str, int] | None = None, provisional_rows: int = 0) -> dict[str, int]:
+    """Writes `df` as `table` in every output format, or appends it when the sizes of the previous run are given.
+
+    Returns the output sizes without the last `provisional_rows` rows (bytes for csv, rows for arrow),
+    so the next incremental run can cut off the provisional rows and continue from there.
+    """
+    append = restore_sizes is not None
+    output_sizes = {}
+    confirmed_rows = len(df) - provisional_rows
+    if 'csv' in output_formats:
+        filename = f'{table}.csv'
+        with open(os.path.join(log_folder, filename), 'a' if append else 'w', encoding='utf-8', newline='') as outfile:
+            df.iloc[:confirmed_rows].to_csv(outfile, header=not append, index=False)
+            output_sizes[filename] = outfile.tell()
+            df.iloc[confirmed_rows:].to_csv(outfile, header=False, index=False)
+    if 'arrow' in output_formats:
+        filename = f'{table}.arrow'
+        if append and len(df) == 0:
+            output_sizes[filename] = restore_sizes[filename]
+        else:
+            keep_rows = restore_sizes[filename] if append else None
+            layers = update_layers(log_folder, df)  # saved before the table, readers never miss a layer
+            total_rows = storage.write_table(os.path.join(log_folder, filename), df, keep_rows, layers)
+            output_sizes[filename] = total_rows - provisional_rows
+    return output_sizes
+
+
+def write_pyramid(log_folder: str, timeline_df: pd.DataFrame, output_formats: tuple[str, ...],
+                  restore_sizes: dict[str, int] | None = None,
+                  open_buckets: dict[str, list[dict]] | None = None) -> tuple[dict[str, int], dict[str, list[dict]]]:
+    """Writes the min/max downsampled timeline of every pyramid level, or appends the new rows to them.
+
+    The rows kept for the last bucket of a level are provisional, the next run gets them back in `open_buckets`:
+    the min and max of those and the new rows are the min and max of the whole bucket.
+    Returns the output sizes and the rows of the open buckets.
+    """
+    output_sizes = {}
+    new_open_buckets = {}
+    for minutes in PYRAMID_LEVELS:
+        table = get_level_table(TIMELINE_TABLE, minutes)
+        previous_rows = records_to_timeline(open_buckets[table]) if open_buckets is not None else None
+        level_df = min_max_rows(pd.concat([previous_rows, timeline_df], ignore_index=True), minutes)
+        is_open_bucket = get_open_bucket(level_df, minutes)
+        output_sizes.update(write_output(log_folder, table, level_df, output_formats, restore_sizes,
+                                         provisional_rows=int(is_open_bucket.sum())))
+        new_open_buckets[table] = timeline_to_records(level_df[is_open_bucket])
+    return output_sizes, new_open_buckets
+
+
+def write_rollup(log_folder: str, table: str, rollup_df: pd.DataFrame | None, output_formats: tuple[str, ...],
+                 restore_sizes: dict[str, int] | None = None, open_day: pd.DataFrame | None = None,
+                 provisional: pd.DataFrame | None = None) -> tuple[dict[str, int], pd.DataFrame]:
+    """Writes the new rows of the daily rollup `table`, or appends them when the sizes of the previous run are given.
+
+    The rows of the last day (or week, the first key) can still change, so they are provisional like the current
+    event: the next run cuts them off and gets them back as `open_day` to add its own rows to. `provisional` is the
+    rollup of rows that are not final themselves. Returns the output sizes and the rollup of the last day.
+    """
+    keys, measures = ROLLUP_KEYS[table]
+    rollup_df = rollup.combine([open_day, rollup_df], keys, measures)
+    periods = rollup_df[keys[0]]
+    is_open_day = periods == periods.max()
+    open_day = rollup_df[is_open_day]
+    provisional_df = rollup.combine([open_day, provisional], keys, measures)
+    df = pd.concat([rollup_df[~is_open_day], provisional_df], ignore_index=True)
+    output_sizes = write_output(log_folder, table, df, output_formats, restore_sizes,
+                                provisional_rows=len(provisional_df))
+    return output_sizes, open_day
+
+
+def get_timeline_tail(timeline_df: pd.DataFrame, longest_window: int) -> pd.DataFrame:
+    """The last rows of the timeline that are needed to continue processing:
+    the rolling window for the player change and the current layer with the row before it."""
+    layers = timeline_df['layer'].values
+    changes = np.flatnonzero(layers[1:] != layers[:-1]) + 1
+    segment_start = changes[-1] - 1 if len(changes) else 0
+    times = timeline_df['time']
+    window_start = times.searchsorted(times.iloc[-1] - pd.Timedelta(minutes=longest_window), side='right')
+    return timeline_df.iloc[min(segment_start, window_start):]
+
+
+def timeline_to_records(timeline_df: pd.DataFrame, time_column: str = 'time') -> list[dict]:
+    records = timeline_df.to_dict('records')
+    for record in records:
+        record[time_column] = record[time_column].isoformat()
+    return records
+
+
+def records_to_timeline(records: list[dict], time_column: str = 'time') -> pd.DataFrame | None:
+    if not records:
+        return None
+    df = pd.DataFrame.from_records(records)
+    df[time_column] = pd.to_datetime(df[time_column], format='ISO8601')
+    return df
+
+
+def load_checkpoint(log_folder: str) -> dict | None:
+    path = os.path.join(log_folder, CHECKPOINT_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as infile:
+        checkpoint = json.load(infile)
+    if checkpoint.get('version') != CHECKPOINT_VERSION:
+        return None
+    return checkpoint
+
+
+def save_checkpoint(log_folder: str, checkpoint: dict):
+    write_json(os.path.join(log_folder, CHECKPOINT_FILE), checkpoint)
+
+
+def write_json(path: str, data: dict):
+    with open(path + '.tmp', 'w', encoding='utf-8') as outfile:
+        json.dump(data, outfile)
+    os.replace(path + '.tmp', path)
+
+
+def create_status(timeline_df: pd.DataFrame, current_event: str, player_change_windows: tuple[int, ...],
+                  thresholds: EventThresholds = DEFAULT_THRESHOLDS) -> dict:
+    """The current state of the server for the status banner and API, from the last rows of the timeline.
+    `timeline_df` has to start before the current layer, like the checkpoint tail does."""
+    last_row = timeline_df.iloc[-1]
+    layers = timeline_df['layer'].values
+    changes = np.flatnonzero(layers[1:] != layers[:-1]) + 1
+    # the layer started after the last sample of the previous one
+    layer_start_time = timeline_df['time'].iloc[changes[-1] - 1].isoformat() if len(changes) else None
+    player_changes = {get_player_change_column(window): float(last_row[get_player_change_column(window)])
+                      for window in player_change_windows}
+
+    live_in_minutes = None
+    # without the window among the player change windows there is no prediction, see check_player_change_windows
+    player_change = player_changes.get(get_player_change_column(LIVE_PREDICTION_WINDOW))
+    if current_event == 'seed' and player_change is not None and player_change > 0:
+        live_in_minutes = ((thresholds.live_players - int(last_row['player_count'])) / player_change
+                           * LIVE_PREDICTION_WINDOW)
+    return {
+        'time': last_row['time'].isoformat(),
+        'player_count': int(last_row['player_count']),
+        'layer': last_row['layer'],
+        'layer_start_time': layer_start_time,
+        'source': last_row['source'],
+        'state': current_event,
+        **player_changes,
+        'live_in_minutes': live_in_minutes,
+    }
+
+
+def check_player_change_windows(player_change_windows: tuple[int, ...]):
+    if LIVE_PREDICTION_WINDOW not in player_change_windows:
+        logging.warning(f'The player change windows have no {LIVE_PREDICTION_WINDOW} minute one, the status will '
+                        f'not predict when the server is live.')
+
+
+def restore_output_sizes(log_folder: str, checkpoint: dict) -> bool:
+    """Cuts the csv outputs back to their state at the checkpoint. This drops the provisional last event
+    and anything written by a run that crashed before saving its checkpoint.
+    The arrow outputs are rewritten on every run and are cut when they are appended to."""
+    for filename, size in checkpoint['output_sizes'].items():
+        path = os.path.join(log_folder, filename)
+        if not os.path.exists(path):
+            return False
+        if filename.endswith('.arrow'):
+            if storage.read_table(path).num_rows < size:
+                return False
+            continue
+        if os.path.getsize(path) < size:
+            return False
+        with open(path, 'r+b') as outfile:
+            outfile.truncate(size)
+    return True
+
+
+def create_event_log(timeline_df: pd.DataFrame, thresholds: EventThresholds = DEFAULT_THRESHOLDS) -> pd.DataFrame:
+    events, current_event, _ = detect_events(
+        timeline_df['player_count'].values, timeline_df['seeding'].values, thresholds=thresholds)
+    event_log = [(0, 'dead')] + events
 
     if current_event in {'live', 'seed'}:  # we finished on Live, we have to add this manually:
-        event_log.append((len(player_count_log) - 1, current_event))
+        event_log.append((len(timeline_df) - 1, current_event))
+
+    return build_event_frame(timeline_df['time'], event_log)
 
-    data = [{
-        'event': event,
-        'time': df.iloc[i]['time'],
-    } for i, event in event_log]
-    event_df = pd.DataFrame.from_records(data)
-    event_df['date'] = event_df['time'].apply(lambda d: d.date())
+
+def build_event_frame(times: pd.Series, event_log: list[tuple[int, str]],
+                      previous_event: tuple[str, pd.Timestamp] | None = None) -> pd.DataFrame:
+    """`previous_event` is the last already written event, used when the log is continued incrementally."""
+    indices = [i for i, _ in event_log]
+    event_df = pd.DataFrame({
+        'event': [event for _, event in event_log],
+        'time': times.iloc[indices].reset_index(drop=True),
+    })
+    event_df['date'] = event_df['time'].dt.date
 
     event_df['previous_event'] = event_df['event'].shift(1)
     event_df['previous_event_time'] = event_df['time'].shift(1)
-    event_df['duration'] = event_df.apply(lambda row: (row['time'] - row['previous_event_time']).total_seconds(),
-                                          axis=1)
-    event_df['hours'] = event_df['duration'].apply(lambda t: round(t / 3600, 2))
+    if previous_event is not None and len(event_df) > 0:
+        event_df.loc[0, 'previous_event'], event_df.loc[0, 'previous_event_time'] = previous_event
+    event_df['duration'] = (event_df['time'] - event_df['previous_event_time']).dt.total_seconds()
+    event_df['hours'] = (event_df['duration'] / 3600).round(2)
     return event_df
 
 
-def parse_battlemetrics_data(d: str):
-    layer = get_regex_from_data(d, re.compile(r'Map;(\w+);'), '')
-    return {
-        'player_count': int(get_regex_from_data(d, re.compile(r'Player count;(\d+)'), '-1')),
-        'layer': layer,
-        'seeding': 'seed' in layer.lower(),
-        'source': 'Battlemetrics'
-    }
+def parse_raw_data(data: pd.Series) -> pd.DataFrame:
+    """Player count, layer, seeding and source of a whole column of raw rows, the source is told by the prefix.
+    Malformed rows are dropped and reported together, the index of the valid rows is kept."""
+    data = data.astype(object).fillna('')
+    is_battlemetrics = data.str.startswith('Rank')
+    is_squadservers = data.str.startswith(';;;')
+    malformed = data[~(is_battlemetrics | is_squadservers)]
+    if len(malformed) > 0:
+        logging.warning(f'Skipped {len(malformed)} malformed rows, first one: {malformed.iloc[0]!r}')
+
+    battlemetrics_df = extract_fields(data[is_battlemetrics], BATTLEMETRICS_PATTERNS, 'Battlemetrics')
+    squadservers_df = extract_fields(data[is_squadservers], SQUADSERVERS_PATTERNS, 'Squad-servers.com')
+    squadservers_df['player_count'] = squadservers_df['player_count'].clip(0, 100)
+    return pd.concat([battlemetrics_df, squadservers_df]).sort_index()
+
+
+def extract_fields(data: pd.Series, patterns: dict[str, re.Pattern], source: str) -> pd.DataFrame:
+    df = pd.DataFrame(index=data.index)
+    df['player_count'] = data.str.extract(patterns['player_count'], expand=False).fillna('-1').astype(np.int64)
+    df['layer'] = data.str.extract(patterns['layer'], expand=False).fillna('')
+    df['seeding'] = df['layer'].str.lower().str.contains('seed', regex=False).astype(bool)
+    df['source'] = source
+    return df
 
 
-def scale_to_0_100(num: int) -> int:
-    return max(min(num, 100), 0)
+def create_timeline(raw_data_with_errors: pd.DataFrame,
+                    player_change_windows: tuple[int, ...] = PLAYER_CHANGE_WINDOWS) -> pd.DataFrame:
+    return add_player_change(parse_timeline(raw_data_with_errors), player_change_windows)
 
 
-def parse_squadservers_data(d: str):
-    layer = get_regex_from_data(d, re.compile(r'Map;;(\w+)'), '')
-    return {
-        'player_count': scale_to_0_100(int(get_regex_from_data(d, re.compile(r'Players;;(\d+)/'), '-1'))),
-        'layer': layer,
-        'seeding': 'seed' in layer.lower(),
-        'source': 'Squad-servers.com'
-    }
+def parse_timeline(raw_data_with_errors: pd.DataFrame) -> pd.DataFrame:
+    # failed queries are logged as ERROR or ERROR:<code>
+    raw_data = raw_data_with_errors[~raw_data_with_errors['data'].astype(object).str.startswith('ERROR', na=False)]
+    timeline_df = parse_raw_data(raw_data['data'])
+    times = pd.to_datetime(raw_data.loc[timeline_df.index, 'time'], format='ISO8601')
+    if len(times) == 0:  # typed like the UTC times of the rows, concatenating an empty timeline keeps the type
+        times = times.dt.tz_localize('UTC')
+    df = pd.concat([times, timeline_df], axis=1)
+    df = df.reset_index(drop=True).query('layer != "Unknown"')
+    return df
 
 
-def process_row(d: str) -> dict:
-    if d == 'ERROR':
-        return {}
-    if d.startswith('Rank'):
-        return parse_battlemetrics_data(d)
-    if d.startswith(';;;'):
-        return parse_squadservers_data(d)
-    print(f'error with {d}')
-    return {}
+def add_player_change(timeline_df: pd.DataFrame,
+                      player_change_windows: tuple[int, ...] = PLAYER_CHANGE_WINDOWS) -> pd.DataFrame:
+    """Adds the change of the player count over the last n minutes for each window, like
+    `rolling(f'{n}min', on='time').apply(lambda x: x.iloc[-1] - x.iloc[0])`, using a binary search
+    for the first sample inside each window instead of a Python call per window."""
+    df = timeline_df
+    times = df['time'].values
+    player_counts = df['player_count'].values.astype(np.float64)
+    for window in player_change_windows:
+        window_start = np.searchsorted(times, times - np.timedelta64(window, 'm'), side='right')
+        df[get_player_change_column(window)] = player_counts - player_counts[window_start]
+    return df
 
 
-def create_timeline(raw_data_with_errors: pd.DataFrame) -> pd.DataFrame:
-    raw_data = raw_data_with_errors.query('data != "ERROR"').copy()
-    df = raw_data[['time']].copy().reset_index()
-    df['time'] = pd.to_datetime(df['time'])
-    processed_data = raw_data['data'].apply(process_row)
-    timeline_df = pd.json_normalize(processed_data)
-    df = pd.concat([df[['time']], timeline_df], axis=1).query('layer != "Unknown"')
-    df['player_change_15_mins'] = df[['player_count', 'time']] \
-        .rolling('15min', on='time') \
-        .apply((lambda x: x.iloc[-1] - x.iloc[0]))['player_count']
-    return df
+def get_player_change_column(window: int) -> str:
+    return f'player_change_{window}_mins'
 
 
 def create_match_data(timeline_df: pd.DataFrame) -> pd.DataFrame:
     df = timeline_df.copy()
-    # I am assuming that your dataframe is named df
     # Make sure your 'time' column is in datetime format
     df['time'] = pd.to_datetime(df['time'])
     df['previous_layer'] = df['layer'].shift(1)
     # Create a new column that indicates when 'layer' changes
     df['layer_changed'] = df['layer'].ne(df['previous_layer'])
-    layer_df = df.query('layer_changed == True').dropna(subset='previous_layer').copy()
-    mapchange_indices = zip([0] + list(layer_df.index)[:-1],
-                            list(layer_df.index))  # dirty trick to get the index intervals
-    mapchange_player_counts = [np.mean(df['player_count'].loc[start: stop]) for start, stop in mapchange_indices]
+    # a match ends on the first sample of the next layer, that sample also counts towards its player counts
+    change_positions = np.flatnonzero(df['layer_changed'].values[1:]) + 1
+    start_positions = np.r_[0, change_positions][:len(change_positions)].astype(np.intp)
+    player_counts = df['player_count'].values
+    end_player_counts = player_counts[change_positions]
+    # reduceat runs the last reduction to the end of the array, so cut it at the last layer change
+    match_player_counts = player_counts[:change_positions[-1] if len(change_positions) else 0]
+    layer_df = df.iloc[change_positions].copy()
 
     # Calculate the time difference for each row compared to the previous row
     layer_df['time_diff'] = layer_df['time'].diff()
-    layer_df['mean_player_count'] = mapchange_player_counts
-    layer_df['hours'] = layer_df['time_diff'].apply(lambda t: t.total_seconds() / 3600)
-
-    layer_df['minutes'] = layer_df['time_diff'].apply(lambda t: t.total_seconds() / 60)
-    layer_df['map_name'] = layer_df['previous_layer'].apply(lambda l: split_layer(l)[0])
-    layer_df['game_mode'] = layer_df['previous_layer'].apply(lambda l: split_layer(l)[1])
-    layer_df['version'] = layer_df['previous_layer'].apply(lambda l: split_layer(l)[2])
+    player_count_sums = np.add.reduceat(match_player_counts.astype(np.float64), start_positions) + end_player_counts
+    layer_df['mean_player_count'] = player_count_sums / (change_positions - start_positions + 1)
+    layer_df['hours'] = layer_df['time_diff'].dt.total_seconds() / 3600
+
+    layer_df['minutes'] = layer_df['time_diff'].dt.total_seconds() / 60
+    layer_parts = pd.DataFrame.from_dict(
+        {layer: split_layer(layer) for layer in layer_df['previous_layer'].unique()},
+        orient='index', columns=['map_name', 'game_mode', 'version'])
+    layer_df = layer_df.join(layer_parts, on='previous_layer')
     layer_df['live'] = layer_df['game_mode'] != 'Seed'
-    # Forward fill the NA values
-    # df['time_diff_since_last_change'] = df['time_diff_since_last_change'].fillna(method='ffill')
-
-    return layer_df.dropna(subset='previous_layer')
+    layer_df['start_time'] = df['time'].iloc[start_positions].set_axis(layer_df.index)
+    layer_df['min_player_count'] = np.minimum(np.minimum.reduceat(match_player_counts, start_positions),
+                                              end_player_counts)
+    layer_df['max_player_count'] = np.maximum(np.maximum.reduceat(match_player_counts, start_positions),
+                                              end_player_counts)
+    return layer_df
 
 
 @lru_cache(512)
@@ -187,20 +600,18 @@ def split_layer(layer_name: str) -> tuple[str, str, str]:
     return mapname, gamemode, version
 
 
-def get_regex_from_data(data: str, pattern: re.Pattern, default: str) -> str:
-    match = re.search(pattern, data)
-    if match:
-        return match.group(1)
-    return default
-
-
 def main():
     args = parse_args()
-    process(args.log_folder)
-    schedule.every(1).minutes.do(process, log_folder=args.log_folder)
+    check_player_change_windows(args.player_change_windows)
+    # listen before the first run, so rows written during it are announced
+    listener = notify.Listener(args.log_folder)
+    process(args.log_folder, rebuild=args.rebuild, player_change_windows=args.player_change_windows,
+            output_formats=args.output_formats, prerender_figures=not args.no_prerender)
     while True:
-        schedule.run_pending()
-        time.sleep(1)
+        if listener.wait(args.idle_timeout):
+            listener.debounce(args.debounce, args.max_delay)
+        process(args.log_folder, player_change_windows=args.player_change_windows, output_formats=args.output_formats,
+                prerender_figures=not args.no_prerender)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import os
+import sys
+import threading
+from collections import Counter
+
+
+class SamplingProfiler:
+    """Samples the call stack of the thread that entered it every `interval` seconds, from a background thread.
+
+    The stacks are saved in the folded format of flamegraph.pl, which speedscope and most flame graph
+    viewers open too. Sampling costs nothing in the profiled thread, but the sampler competes for the GIL,
+    so only use it when looking for a slow spot.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.stacks: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+        self._thread_id = None
+
+    def __enter__(self) -> SamplingProfiler:
+        self._thread_id = threading.get_ident()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if names:
+                self.stacks[';'.join(reversed(names))] += 1
+
+    def folded(self) -> str:
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as outfile:
+            outfile.write(self.folded())
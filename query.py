@@ -1,73 +1,189 @@
 from __future__ import annotations
 
+import functools
+import json
 import os.path
 import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timezone
-import re
+from typing import Callable
 
 import argparse
-import requests
-import csv
 import schedule
-from bs4 import BeautifulSoup
 
 import logging
 
+import extract
+import notify
+import raw_log
+from hedge import HedgedFetcher
+from http_client import FetchResult, HttpClient
+from metrics import Metrics
+
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+BATTLEMETRICS_URL = 'https://www.battlemetrics.com/servers/squad/{server_id}'
+SQUADSERVERS_URL = 'https://squad-servers.com/server/{server_id}/'
+NO_SERVER_INFO = 'no_server_info'
+INCOMPLETE_SERVER_INFO = 'incomplete_server_info'
+
+server_metrics: dict[str, Metrics] = {}  # by server name, saved to the folder of the server after every query
+
+
+@dataclass(frozen=True)
+class Server:
+    name: str
+    battlemetrics_id: int
+    squadservers_id: int
+    folder: str
+
+
 def main():
     args = parse_args()
-    job(args.server_id_battlemetrics, args.server_id_squadservers, args.log_folder)
+    servers = load_servers(args)
+    for server in servers:
+        os.makedirs(server.folder, exist_ok=True)
+    executor = ThreadPoolExecutor(max_workers=args.max_workers)
+    client = HttpClient(connect_timeout=args.connect_timeout, read_timeout=args.read_timeout,
+                        max_retries=args.max_retries, pool_size=args.max_workers)
+    hedger = None
+    if args.hedge_delay is not None:
+        hedger = HedgedFetcher(args.hedge_delay, lambda server_info: not is_error(server_info),
+                               max_workers=2 * args.max_workers)
+    in_flight: dict[str, Future] = {}
+    poll(servers, executor, in_flight, client, args.compact_raw_log, hedger)
     schedule.every(args.frequency).minutes.do(
-        job,
-        battlemetrics_id=args.server_id_battlemetrics,
-        squadservers_id=args.server_id_squadservers,
-        folder=args.log_folder
-    )
+        poll, servers=servers, executor=executor, in_flight=in_flight, client=client, compact=args.compact_raw_log,
+        hedger=hedger)
     while True:
         schedule.run_pending()
-        time.sleep(1)
+        time.sleep(max(schedule.idle_seconds(), 0))
 
 
 def parse_args():
     parser = argparse.ArgumentParser(description='My Application')
     parser.add_argument('--server_id_battlemetrics', '-B', type=int, help='Battlemetrics ID')
     parser.add_argument('--server_id_squadservers', '-S', type=int, help='Squad-servers.com ID')
+    parser.add_argument('--servers_file', type=str,
+                        help='JSON list of servers with name, battlemetrics_id and squadservers_id, '
+                             'each is logged to its own subfolder of the log folder')
     parser.add_argument('--log_folder', type=str, help='Folder for logging', default='./data')
     parser.add_argument('--frequency', type=int, help='Queries every n minutes', default=1)
+    parser.add_argument('--max_workers', type=int, help='Servers queried at the same time', default=8)
+    parser.add_argument('--connect_timeout', type=float, help='Connect timeout in seconds', default=5)
+    parser.add_argument('--read_timeout', type=float, help='Read timeout in seconds', default=20)
+    parser.add_argument('--max_retries', type=int, help='Retries of a failed request', default=3)
+    parser.add_argument('--compact_raw_log', action='store_true',
+                        help='Log only the fields the processor reads instead of the full server info text')
+    parser.add_argument('--hedge_delay', type=float,
+                        help='Query squad-servers.com too: the faster source is queried first and the other one '
+                             'when there is no valid answer after this many seconds (0: both at the same time). '
+                             'Without it only Battlemetrics is queried')
 
     args = parser.parse_args()
     return args
 
 
-def get_server_info(server_id_battlemetrics: int, server_id_squadservers: int) -> str:
-    # squad_server_info = get_server_info_squad_servers(server_id_squadservers)
-    # if squad_server_info != 'ERROR':
-    #     return squad_server_info
+def load_servers(args: argparse.Namespace) -> list[Server]:
+    if args.servers_file is None:
+        return [Server('default', args.server_id_battlemetrics, args.server_id_squadservers, args.log_folder)]
+    with open(args.servers_file, encoding='utf-8') as infile:
+        server_configs = json.load(infile)
+    return [Server(
+        name=config['name'],
+        battlemetrics_id=config.get('battlemetrics_id'),
+        squadservers_id=config.get('squadservers_id'),
+        folder=os.path.join(args.log_folder, config['name']),
+    ) for config in server_configs]
+
+
+def poll(servers: list[Server], executor: ThreadPoolExecutor, in_flight: dict[str, Future], client: HttpClient,
+         compact: bool = False, hedger: HedgedFetcher | None = None):
+    """Submits a query of every server and returns without waiting for them, so every server keeps its schedule.
+    A server whose query from an earlier cycle is still running is skipped, so a hanging server only affects itself."""
+    for server in servers:
+        if server.name in in_flight and not in_flight[server.name].done():
+            logging.warning(f'[{server.name}] Previous query is still running, skipping this cycle.')
+            continue
+        future = executor.submit(job, server, client, compact, hedger)
+        future.add_done_callback(functools.partial(log_failure, server.name))
+        in_flight[server.name] = future
+
+
+def log_failure(name: str, future: Future):
+    if future.exception() is not None:
+        logging.error(f'[{name}] Query failed: {future.exception()!r}')
+
+
+def get_server_info(server: Server, client: HttpClient, compact: bool = False,
+                    hedger: HedgedFetcher | None = None, metrics: Metrics | None = None) -> str:
+    if hedger is None:
+        return get_server_info_battlemetrics(server.battlemetrics_id, client, compact, metrics)
+
+    fetchers = {}
+    if server.battlemetrics_id is not None:
+        fetchers[extract.BATTLEMETRICS] = lambda: get_server_info_battlemetrics(server.battlemetrics_id, client,
+                                                                                compact, metrics)
+    if server.squadservers_id is not None:
+        fetchers[extract.SQUADSERVERS] = lambda: get_server_info_squad_servers(server.squadservers_id, client,
+                                                                               compact, metrics)
+    return hedger.fetch(server.name, fetchers)
+
+
+def get_server_info_battlemetrics(server_id: int, client: HttpClient, compact: bool = False,
+                                  metrics: Metrics | None = None) -> str:
+    return fetch_server_info(BATTLEMETRICS_URL.format(server_id=server_id), extract.BATTLEMETRICS,
+                             extract.extract_battlemetrics, client, compact, metrics)
+
+
+def get_server_info_squad_servers(server_id: int, client: HttpClient, compact: bool = False,
+                                  metrics: Metrics | None = None) -> str:
+    return fetch_server_info(SQUADSERVERS_URL.format(server_id=server_id), extract.SQUADSERVERS,
+                             extract.extract_squadservers, client, compact, metrics)
+
+
+def fetch_server_info(url: str, source: str, extract_function: Callable[[str], extract.ServerInfo | None],
+                      client: HttpClient, compact: bool = False, metrics: Metrics | None = None) -> str:
+    response = client.get(url)
+    parse_seconds = None
+    if response.error is not None:
+        server_info = format_error(response.error)
+    else:
+        starttime = time.perf_counter()
+        extracted = extract_function(response.text)
+        parse_seconds = time.perf_counter() - starttime
+        if extracted is None:
+            server_info = format_error(NO_SERVER_INFO)
+        elif extracted.player_count is None or extracted.layer is None:
+            server_info = format_error(INCOMPLETE_SERVER_INFO)
+        else:
+            server_info = extracted.to_row(compact)
+    if metrics is not None:
+        record_fetch(metrics, source, response, parse_seconds, server_info)
+    return server_info
 
-    battlemetrics_data = get_server_info_battlemetrics(server_id_battlemetrics)
-    return battlemetrics_data
 
+def record_fetch(metrics: Metrics, source: str, response: FetchResult, parse_seconds: float | None,
+                 server_info: str):
+    metrics.observe('fetch_seconds', response.latency, source=source)
+    metrics.inc('fetch_retries_total', response.retries, source=source)
+    if response.text is not None and not response.not_modified:
+        metrics.inc('fetch_bytes_total', len(response.text.encode('utf-8')), source=source)
+    if parse_seconds is not None:
+        metrics.observe('parse_seconds', parse_seconds, source=source)
+    # the error code, or ok
+    result = server_info.split(':', 1)[1] if is_error(server_info) else 'ok'
+    metrics.inc('queries_total', source=source, result=result)
 
-def get_server_info_battlemetrics(server_id: int) -> str:
-    response = requests.get(f'https://www.battlemetrics.com/servers/squad/{server_id}')
-    soup = BeautifulSoup(response.text, features='html.parser')
-    server_info = soup.find('div', {'class': 'server-info'})
-    if server_info is None:
-        return 'ERROR'
 
-    return server_info.get_text(separator=';')
+def format_error(code: str) -> str:
+    return f'ERROR:{code}'
 
 
-def get_server_info_squad_servers(server_id: int) -> str:
-    response = requests.get(f'https://squad-servers.com/server/{server_id}/')
-    soup = BeautifulSoup(response.text, features='html.parser')
-    server_info = soup.find('table', {'class': 'table table-bordered'})
-    if server_info is None:
-        return 'ERROR'
-    text = server_info.get_text(separator=';')
-    return re.sub(r'\s', '', text)
+def is_error(server_info: str) -> bool:
+    return server_info.startswith('ERROR')
 
 
 def get_current_time() -> str:
@@ -76,16 +192,24 @@ def get_current_time() -> str:
     return formatted_utc_time
 
 
-def job(battlemetrics_id: int, squadservers_id: int, folder: str):
-    with open(os.path.join(folder, 'raw_query_log.csv'), 'a', encoding='utf-8') as outfile:
-        writer = csv.writer(outfile)
-        server_info = get_server_info(battlemetrics_id, squadservers_id)
+def get_metrics(server: Server) -> Metrics:
+    return server_metrics.setdefault(server.name, Metrics('poller'))
+
+
+def job(server: Server, client: HttpClient, compact: bool = False, hedger: HedgedFetcher | None = None):
+    metrics = get_metrics(server)
+    with metrics.time('job_seconds'):
+        server_info = get_server_info(server, client, compact, hedger, metrics)
         current_time = get_current_time()
-        if server_info != 'ERROR':
-            logging.info(f'Successful query.')
+        if not is_error(server_info):
+            logging.info(f'[{server.name}] Successful query.')
         else:
-            logging.info(f'Unsuccessful query.')
-        writer.writerow([current_time, server_info])
+            logging.info(f'[{server.name}] Unsuccessful query: {server_info}.')
+        raw_log.append_row(server.folder, current_time, server_info)
+        if not is_error(server_info):  # a failed query has nothing to process
+            notify.notify(server.folder)
+    metrics.inc('rows_total', result='ok' if not is_error(server_info) else 'error')
+    metrics.save(server.folder)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import argparse
+import csv
+import gzip
+import io
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+
+import pandas as pd
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+RAW_LOG_FOLDER = 'raw'  # one partition per UTC day: <day>.csv while it's written, <day>.csv.gz once closed
+MANIFEST_FILE = 'manifest.json'
+LEGACY_RAW_LOG_FILE = 'raw_query_log.csv'
+DAY_PATTERN = re.compile(r'\d{4}-\d{2}-\d{2}')
+
+_lock = threading.Lock()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Split a single raw query log into daily partitions')
+    parser.add_argument('--log_folder', type=str, help='Folder of the raw query log', default='./data')
+
+    args = parser.parse_args()
+    return args
+
+
+def append_row(log_folder: str, time: str, data: str):
+    """Appends a row to the partition of its day. The first row of a new day closes the partitions before it."""
+    day = get_day(time)
+    path = os.path.join(log_folder, RAW_LOG_FOLDER, f'{day}.csv')
+    with _lock:
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            close_partitions(log_folder, before=day)
+            manifest = load_manifest(log_folder)
+            manifest['partitions'].append({'day': day, 'file': f'{day}.csv', 'compressed': False, 'size': None})
+            save_manifest(log_folder, manifest)
+        with open(path, 'a', encoding='utf-8') as outfile:
+            writer = csv.writer(outfile)
+            writer.writerow([time, data])
+
+
+def get_day(time: str) -> str:
+    return time[:10]  # the times are UTC ISO 8601
+
+
+def close_partitions(log_folder: str, before: str):
+    """Compresses the partitions of the days before `before`, nothing is written to them anymore.
+    The compressed file is complete before it's in the manifest and before the plain one is removed,
+    so readers always find one of them."""
+    manifest = load_manifest(log_folder)
+    for partition in manifest['partitions']:
+        if partition['compressed'] or partition['day'] >= before:
+            continue
+        path = os.path.join(log_folder, RAW_LOG_FOLDER, partition['file'])
+        with open(path, 'rb') as infile, gzip.open(path + '.gz.tmp', 'wb') as outfile:
+            shutil.copyfileobj(infile, outfile)
+        os.replace(path + '.gz.tmp', path + '.gz')
+        partition.update({'file': partition['file'] + '.gz', 'compressed': True, 'size': os.path.getsize(path)})
+        save_manifest(log_folder, manifest)
+        os.remove(path)
+        logging.info(f'Closed raw log partition {partition["day"]}.')
+
+
+def load_manifest(log_folder: str) -> dict:
+    path = os.path.join(log_folder, RAW_LOG_FOLDER, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {'partitions': []}
+    with open(path, encoding='utf-8') as infile:
+        return json.load(infile)
+
+
+def save_manifest(log_folder: str, manifest: dict):
+    path = os.path.join(log_folder, RAW_LOG_FOLDER, MANIFEST_FILE)
+    manifest['partitions'].sort(key=lambda partition: partition['day'])
+    with open(path + '.tmp', 'w', encoding='utf-8') as outfile:
+        json.dump(manifest, outfile, indent=1)
+    os.replace(path + '.tmp', path)
+
+
+def read_partition(log_folder: str, day: str, offset: int = 0) -> bytes:
+    path = os.path.join(log_folder, RAW_LOG_FOLDER, f'{day}.csv')
+    try:
+        infile = open(path, 'rb')
+    except FileNotFoundError:  # closed since the manifest was read
+        infile = gzip.open(path + '.gz', 'rb')
+    with infile:
+        infile.seek(offset)
+        return infile.read()
+
+
+def read_raw_log(log_folder: str, position: dict | None = None, first_day: str | None = None,
+                 last_day: str | None = None) -> tuple[pd.DataFrame, dict | None]:
+    """Reads the complete rows after `position`, or of the days from `first_day` to `last_day` if there is none.
+    Only the partitions of those days are opened. Returns the rows with the position after the last one.
+
+    A position is the day of a partition and a byte offset in its uncompressed content.
+    """
+    partitions = load_manifest(log_folder)['partitions']
+    if position is not None:
+        first_day, offset = position['day'], position['offset']
+    else:
+        offset = 0
+        if not partitions and os.path.exists(os.path.join(log_folder, LEGACY_RAW_LOG_FILE)):
+            logging.warning(f'{log_folder} has a single file raw log, split it with: '
+                            f'python raw_log.py --log_folder {log_folder}')
+    days = [partition['day'] for partition in partitions
+            if (first_day is None or partition['day'] >= first_day)
+            and (last_day is None or partition['day'] <= last_day)]
+    contents = []
+    for day in days:
+        content = read_partition(log_folder, day, offset if day == first_day else 0)
+        # the poller may be in the middle of writing the last row
+        end = content.rfind(b'\n') + 1
+        contents.append(content[:end])
+        position = {'day': day, 'offset': (offset if day == first_day else 0) + end}
+    content = b''.join(contents)
+    if not content:
+        return pd.DataFrame(columns=['time', 'data']), position
+    return pd.read_csv(io.BytesIO(content), names=['time', 'data']), position
+
+
+def is_valid_position(log_folder: str, position: dict) -> bool:
+    """Whether the partition of the position still exists and is at least as long as the position."""
+    for partition in load_manifest(log_folder)['partitions']:
+        if partition['day'] == position['day']:
+            size = partition['size']
+            if size is None:
+                path = os.path.join(log_folder, RAW_LOG_FOLDER, partition['file'])
+                size = os.path.getsize(path) if os.path.exists(path) \
+                    else len(read_partition(log_folder, partition['day']))
+            return size >= position['offset']
+    return False
+
+
+def migrate(log_folder: str):
+    """Splits the single file raw log of `log_folder` into daily partitions and closes all but the last one.
+    Rows the poller already wrote to a partition are kept after the migrated ones of the same day.
+    The old file is renamed to <name>.migrated, not deleted. Stop the poller while migrating.
+
+    The rows are read as CSV records, the server info of a row can span several lines. The partitions and the
+    manifest are only changed once the whole file is split, a failed migration leaves them as they were.
+    """
+    legacy_path = os.path.join(log_folder, LEGACY_RAW_LOG_FILE)
+    folder = os.path.join(log_folder, RAW_LOG_FOLDER)
+    os.makedirs(folder, exist_ok=True)
+    with _lock:
+        migrated_days = split_legacy_log(legacy_path, folder)
+        manifest = load_manifest(log_folder)
+        existing_days = {partition['day'] for partition in manifest['partitions']}
+        for day in migrated_days:
+            path = os.path.join(folder, f'{day}.csv')
+            if day in existing_days:
+                with open(path + '.migrating', 'ab') as outfile:
+                    outfile.write(read_partition(log_folder, day))
+                if os.path.exists(path + '.gz'):
+                    os.remove(path + '.gz')
+                manifest['partitions'] = [partition for partition in manifest['partitions'] if partition['day'] != day]
+            os.replace(path + '.migrating', path)
+            manifest['partitions'].append({'day': day, 'file': f'{day}.csv', 'compressed': False, 'size': None})
+            logging.info(f'Migrated raw log partition {day}.')
+        save_manifest(log_folder, manifest)
+        last_day = manifest['partitions'][-1]['day'] if manifest['partitions'] else None
+        if last_day is not None:
+            close_partitions(log_folder, before=last_day)
+    os.replace(legacy_path, legacy_path + '.migrated')
+
+
+def split_legacy_log(legacy_path: str, folder: str) -> list[str]:
+    """Writes the rows of the single file raw log to <day>.csv.migrating in `folder`, in the order they are in.
+    Returns the days. On an error the files written so far are removed."""
+    days = set()
+    day = None
+    outfile = None
+    try:
+        with open(legacy_path, encoding='utf-8', newline='') as infile:
+            for number, row in enumerate(csv.reader(infile), start=1):
+                row_day = get_day(row[0]) if row else ''
+                if not DAY_PATTERN.fullmatch(row_day):
+                    raise ValueError(f'{legacy_path}: row {number} does not start with a time: {row!r}')
+                if row_day != day:
+                    if outfile is not None:
+                        outfile.close()
+                    day = row_day
+                    # a day can come back after a clock change, its rows are appended to the ones it has
+                    outfile = open(os.path.join(folder, f'{day}.csv.migrating'), 'a' if day in days else 'w',
+                                   encoding='utf-8')
+                    writer = csv.writer(outfile)
+                    days.add(day)
+                writer.writerow(row)
+    except BaseException:
+        if outfile is not None:
+            outfile.close()
+        for day in days:
+            os.remove(os.path.join(folder, f'{day}.csv.migrating'))
+        raise
+    if outfile is not None:
+        outfile.close()
+    return sorted(days)
+
+
+def main():
+    args = parse_args()
+    migrate(args.log_folder)
+
+
+if __name__ == '__main__':
+    main()
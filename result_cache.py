@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+import plotly.utils
+
+
+class ResultCache:
+    """Least recently used cache of callback results (figures, components) with a memory cap.
+
+    The size of a result is the size of its JSON, which is what Dash sends for it. Concurrent requests
+    for the same missing key wait for one computation instead of all doing it.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, max_entries: int = 1024):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.size = 0
+        self.counters = {'hits': 0, 'misses': 0, 'evictions': 0}
+        self._entries: OrderedDict[Hashable, tuple[int, Any]] = OrderedDict()
+        self._key_locks: dict[Hashable, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    self.counters['hits'] += 1
+                    return self._entries[key][1]
+                self.counters['misses'] += 1
+            value = compute()
+            self.put(key, value)
+        with self._lock:
+            self._key_locks.pop(key, None)
+        return value
+
+    def put(self, key: Hashable, value: Any):
+        size = len(json.dumps(value, cls=plotly.utils.PlotlyJSONEncoder))
+        with self._lock:
+            if key in self._entries:
+                self.size -= self._entries.pop(key)[0]
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (size, value)
+            self.size += size
+            while self.size > self.max_bytes or len(self._entries) > self.max_entries:
+                _, (evicted_size, _) = self._entries.popitem(last=False)
+                self.size -= evicted_size
+                self.counters['evictions'] += 1
+
+    def get_size(self, key: Hashable) -> int | None:
+        """The JSON size of the cached result, None if it's not cached."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return None if entry is None else entry[0]
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {**self.counters, 'entries': len(self._entries), 'bytes': self.size}
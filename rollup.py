@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+PLAYER_BUCKET_SIZE = 10  # mean player count thresholds on the match rollup have to be multiples of this
+MATCH_KEYS = ['day', 'previous_layer', 'map_name', 'game_mode', 'version', 'live', 'player_bucket']
+MATCH_MEASURES = ['count', 'hours', 'player_minutes']
+EVENT_KEYS = ['day', 'previous_event']
+EVENT_MEASURES = ['count', 'hours']
+POPULATION_KEYS = ['week', 'hour_of_week', 'player_bucket']
+POPULATION_MEASURES = ['count']
+SEED_CURVE_KEYS = ['week', 'minute']
+SEED_CURVE_MEASURES = ['seeds', 'count', 'player_sum']
+SEED_CURVE_MINUTES = 180  # the player counts are followed this long after the start of a seed
+SEED_CURVE_STEP = 5  # minutes
+PERIOD_LENGTHS = {'day': pd.Timedelta(days=1), 'week': pd.Timedelta(weeks=1)}
+
+
+def rollup_matches(match_df: pd.DataFrame) -> pd.DataFrame:
+    """Number of matches, hours and player-minutes played per day, layer and mean player count bucket.
+    A match counts towards the day it ended on, like the match table is filtered on its end time."""
+    df = match_df.assign(
+        day=match_df['time'].dt.normalize(),
+        player_bucket=(match_df['mean_player_count'] // PLAYER_BUCKET_SIZE * PLAYER_BUCKET_SIZE).astype('int64'),
+        count=1,
+        player_minutes=match_df['mean_player_count'] * match_df['minutes'],
+    )
+    return aggregate(df, MATCH_KEYS, MATCH_MEASURES)
+
+
+def rollup_events(event_df: pd.DataFrame) -> pd.DataFrame:
+    """Number and hours of the seed, live, dying and dead periods per day they ended on."""
+    df = event_df[event_df['previous_event'].notna()]
+    df = df.assign(day=df['time'].dt.normalize(), count=1)
+    return aggregate(df, EVENT_KEYS, EVENT_MEASURES)
+
+
+def rollup_population(timeline_df: pd.DataFrame) -> pd.DataFrame:
+    """Number of samples per week, hour of the week (0 is Monday 0:00) and player count bucket."""
+    df = timeline_df[timeline_df['player_count'] >= 0]
+    times = df['time']
+    df = df.assign(
+        week=get_week(times),
+        hour_of_week=(times.dt.weekday * 24 + times.dt.hour).astype('int64'),
+        player_bucket=(df['player_count'] // PLAYER_BUCKET_SIZE * PLAYER_BUCKET_SIZE).astype('int64'),
+        count=1,
+    )
+    return aggregate(df, POPULATION_KEYS, POPULATION_MEASURES)
+
+
+def rollup_seed_curves(timeline_df: pd.DataFrame, seed_starts: pd.Series) -> pd.DataFrame:
+    """Samples and the sum of their player counts per SEED_CURVE_STEP minutes after the start of a seed,
+    for the first SEED_CURVE_MINUTES of every seed. `seed_starts` are the sorted start times of the seeds,
+    a sample belongs to the last one before it. The curves count towards the week their seed started in."""
+    df = timeline_df[timeline_df['player_count'] >= 0]
+    if len(seed_starts) == 0:
+        df = df.iloc[:0]
+    times = df['time']
+    positions = np.searchsorted(seed_starts.values, times.values, side='right') - 1
+    start_times = seed_starts.iloc[np.maximum(positions, 0)].set_axis(df.index)
+    offsets = times - start_times
+    is_curve = (positions >= 0) & (offsets < pd.Timedelta(minutes=SEED_CURVE_MINUTES)).values
+    df, start_times, offsets = df[is_curve], start_times[is_curve], offsets[is_curve]
+    step = pd.Timedelta(minutes=SEED_CURVE_STEP)
+    df = df.assign(
+        week=get_week(start_times),
+        minute=(offsets // step * SEED_CURVE_STEP).astype('int64'),
+        seeds=(offsets == pd.Timedelta(0)).astype('int64'),  # the first sample of a seed is its start
+        count=1,
+        player_sum=df['player_count'].astype('int64'),
+    )
+    return aggregate(df, SEED_CURVE_KEYS, SEED_CURVE_MEASURES)
+
+
+def get_seed_starts(event_df: pd.DataFrame) -> pd.Series:
+    """The times the server started seeding, from the events of `create_event_log`."""
+    is_start = (event_df['event'] == 'seed') & (event_df['previous_event'] != 'seed')
+    return event_df.loc[is_start, 'time'].reset_index(drop=True)
+
+
+def get_week(times: pd.Series) -> pd.Series:
+    """The Monday 0:00 starting the week of each time."""
+    days = times.dt.normalize()
+    return days - pd.to_timedelta(days.dt.weekday, unit='D')
+
+
+def floor_period(time: pd.Timestamp, period: str) -> pd.Timestamp:
+    day = time.floor('D')
+    return day - pd.Timedelta(days=day.weekday()) if period == 'week' else day
+
+
+def ceil_period(time: pd.Timestamp, period: str) -> pd.Timestamp:
+    start = floor_period(time, period)
+    return start if start == time else start + PERIOD_LENGTHS[period]
+
+
+def aggregate(df: pd.DataFrame, keys: list[str], measures: list[str]) -> pd.DataFrame:
+    if len(df) == 0:
+        return pd.DataFrame(columns=keys + measures)
+    return df.groupby(keys, observed=True)[measures].sum().reset_index()
+
+
+def combine(rollups: list[pd.DataFrame | None], keys: list[str], measures: list[str]) -> pd.DataFrame:
+    """Sums rollups of disjoint rows into one, sorted by its keys."""
+    rollups = [rollup_df for rollup_df in rollups if rollup_df is not None and len(rollup_df) > 0]
+    if len(rollups) == 0:
+        return pd.DataFrame(columns=keys + measures)
+    return aggregate(pd.concat(rollups, ignore_index=True), keys, measures)
+
+
+def select_range(rollup_df: pd.DataFrame, rows_df: pd.DataFrame,
+                 timeframe: tuple[pd.Timestamp, pd.Timestamp] | None,
+                 rollup_rows: Callable[[pd.DataFrame], pd.DataFrame],
+                 keys: list[str], measures: list[str]) -> pd.DataFrame:
+    """The rollup of the rows of `rows_df` (sorted by time) between the two times of `timeframe`, both inclusive.
+
+    The periods (the first key, days or weeks) fully inside the range are taken from `rollup_df`, only the rows of
+    the partial periods at the edges of the range are rolled up, so the cost depends on the number of periods and not
+    on the number of rows.
+    """
+    if timeframe is None:
+        return rollup_df
+    start, end = timeframe
+    period = keys[0]
+    # the whole periods are [first_period, last_period)
+    first_period, last_period = ceil_period(start, period), floor_period(end, period)
+    times = rows_df['time']
+    if first_period >= last_period:
+        return rollup_rows(rows_df.iloc[times.searchsorted(start, side='left'):times.searchsorted(end, side='right')])
+    periods = rollup_df[period]
+    whole_periods = rollup_df.iloc[periods.searchsorted(first_period, side='left'):
+                                   periods.searchsorted(last_period, side='left')]
+    start_edge = rows_df.iloc[times.searchsorted(start, side='left'):times.searchsorted(first_period, side='left')]
+    end_edge = rows_df.iloc[times.searchsorted(last_period, side='left'):times.searchsorted(end, side='right')]
+    return combine([whole_periods, rollup_rows(start_edge), rollup_rows(end_edge)], keys, measures)
+
+
+def select_matches(rollup_df: pd.DataFrame, match_df: pd.DataFrame,
+                   timeframe: tuple[pd.Timestamp, pd.Timestamp] | None) -> pd.DataFrame:
+    return select_range(rollup_df, match_df, timeframe, rollup_matches, MATCH_KEYS, MATCH_MEASURES)
+
+
+def select_events(rollup_df: pd.DataFrame, event_df: pd.DataFrame,
+                  timeframe: tuple[pd.Timestamp, pd.Timestamp] | None) -> pd.DataFrame:
+    return select_range(rollup_df, event_df, timeframe, rollup_events, EVENT_KEYS, EVENT_MEASURES)
+
+
+def select_population(rollup_df: pd.DataFrame, timeline_df: pd.DataFrame,
+                      timeframe: tuple[pd.Timestamp, pd.Timestamp] | None) -> pd.DataFrame:
+    return select_range(rollup_df, timeline_df, timeframe, rollup_population, POPULATION_KEYS, POPULATION_MEASURES)
+
+
+def select_seed_curves(rollup_df: pd.DataFrame, event_df: pd.DataFrame, timeline_df: pd.DataFrame,
+                       timeframe: tuple[pd.Timestamp, pd.Timestamp] | None) -> pd.DataFrame:
+    """The curves of the seeds that started in the range, also the parts of them after its end."""
+    def rollup_rows(edge_df: pd.DataFrame) -> pd.DataFrame:
+        seed_starts = get_seed_starts(edge_df)
+        if len(seed_starts) == 0:
+            return rollup_seed_curves(timeline_df.iloc[:0], seed_starts)
+        # the samples up to the end of the last curve, or up to the next seed if that starts earlier
+        end = seed_starts.iloc[-1] + pd.Timedelta(minutes=SEED_CURVE_MINUTES)
+        event_times = event_df['time']
+        next_df = event_df.iloc[event_times.searchsorted(seed_starts.iloc[-1], side='right'):
+                                event_times.searchsorted(end, side='left')]
+        next_starts = get_seed_starts(next_df)
+        if len(next_starts) > 0:
+            end = next_starts.iloc[0]
+        times = timeline_df['time']
+        samples = timeline_df.iloc[times.searchsorted(seed_starts.iloc[0], side='left'):
+                                   times.searchsorted(end, side='left')]
+        return rollup_seed_curves(samples, seed_starts)
+
+    return select_range(rollup_df, event_df, timeframe, rollup_rows, SEED_CURVE_KEYS, SEED_CURVE_MEASURES)
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+
+import pandas as pd
+import pyarrow as pa
+
+# the processed tables, written by the processor to the log folder as <table>.arrow and read by the dashboard
+TIMELINE_TABLE = 'processed_timeline'
+MATCH_TABLE = 'match_info'
+SEED_LIVE_TABLE = 'seed_live_info'
+MATCH_ROLLUP_TABLE = 'match_rollup'
+EVENT_ROLLUP_TABLE = 'event_rollup'
+POPULATION_ROLLUP_TABLE = 'population_rollup'
+SEED_CURVE_ROLLUP_TABLE = 'seed_curve_rollup'
+# the other files of the log folder the processor writes for the dashboard
+STATUS_FILE = 'status.json'  # the state of the server after the last run
+GENERATION_FILE = 'generation'  # the number of processor runs that changed the outputs, written after all of them
+PRERENDERED_FILE = 'figures.json'  # the figures of the default view, see prerender.py
+LAYERS_FILE = 'layers.json'  # the dictionary of the layer columns of every table, see update_layers
+
+# the column types of the processed tables, shared by the processor when it writes and the dashboard when it reads
+CATEGORICAL_COLUMNS = {'layer', 'previous_layer', 'source', 'map_name', 'game_mode', 'version', 'event',
+                       'previous_event'}
+INTEGER_COLUMNS = {  # the smallest types the values fit in, player counts are -1 when unknown
+    'player_count': 'int16',
+    'min_player_count': 'int16',
+    'max_player_count': 'int16',
+    'player_bucket': 'int16',
+    'hour_of_week': 'int16',
+    'minute': 'int16',
+    'count': 'int32',
+    'seeds': 'int32',
+}
+LAYER_COLUMNS = {'layer', 'previous_layer'}  # encoded with the layer dictionary instead of their own
+TIME_COLUMNS = {'time', 'start_time', 'day', 'week', 'previous_event_time'}
+TIMEDELTA_COLUMNS = {'time_diff'}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Report the memory the processed tables take before and after '
+                                                 'converting them to the compact schema')
+    parser.add_argument('--log_folder', type=str, help='Folder of the processed tables', default='./data')
+
+    args = parser.parse_args()
+    return args
+
+
+def compact(df: pd.DataFrame, layers: list[str] | None = None) -> pd.DataFrame:
+    """Converts the columns of `df` in place to the compact schema and returns it.
+
+    Strings become categoricals with sorted categories, so the dictionaries of the same values are the same
+    whatever order they were read in, and groupbys order like on plain strings. The layer columns get the layer
+    dictionary as categories instead when it's given, see update_layers. That is in the order the layers were
+    first seen, not sorted: sort and group them by `.astype(str)` where the order of the names matters.
+    Counts become small integers and times datetime64 or timedelta64. Columns that are already of their type
+    are not copied, so memory-mapped ones stay mapped.
+    """
+    for column in CATEGORICAL_COLUMNS.intersection(df.columns):
+        values = df[column]
+        if not isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.astype('category')
+        if layers is not None and column in LAYER_COLUMNS:
+            df[column] = set_layer_categories(values, layers)
+        else:
+            df[column] = values.cat.reorder_categories(sorted(values.cat.categories))
+    for column, dtype in INTEGER_COLUMNS.items():
+        if column in df.columns and df[column].dtype != dtype and pd.api.types.is_integer_dtype(df[column]):
+            df[column] = df[column].astype(dtype)
+    for column in TIME_COLUMNS.intersection(df.columns):
+        if not pd.api.types.is_datetime64_any_dtype(df[column]):
+            df[column] = pd.to_datetime(df[column], format='ISO8601')
+    for column in TIMEDELTA_COLUMNS.intersection(df.columns):
+        if not pd.api.types.is_timedelta64_dtype(df[column]):
+            df[column] = pd.to_timedelta(df[column])
+    return df
+
+
+def set_layer_categories(values: pd.Series, layers: list[str]) -> pd.Series:
+    categories = list(values.cat.categories)
+    if categories == layers[:len(categories)]:
+        # written with the dictionary when it was shorter, the codes are already right
+        return values.cat.add_categories(layers[len(categories):])
+    # written before the dictionary existed
+    return values.cat.set_categories(layers + sorted(set(categories).difference(layers)))
+
+
+def load_layers(log_folder: str) -> list[str]:
+    try:
+        with open(os.path.join(log_folder, LAYERS_FILE), encoding='utf-8') as infile:
+            return json.load(infile)
+    except FileNotFoundError:
+        return []
+
+
+def update_layers(log_folder: str, df: pd.DataFrame) -> list[str]:
+    """The layer dictionary of the log folder, with the layers of `df` that are new to it appended and saved.
+
+    The layer columns of every table are encoded with this one dictionary. It is only ever appended to,
+    so the tables written with an earlier version of it have its first categories, and the dashboard
+    extends them to the current dictionary without recoding or sorting anything.
+    """
+    layers = load_layers(log_folder)
+    new_layers = {str(layer) for column in LAYER_COLUMNS.intersection(df.columns)
+                  for layer in df[column].dropna().unique()}.difference(layers)
+    if new_layers:
+        layers += sorted(new_layers)
+        path = os.path.join(log_folder, LAYERS_FILE)
+        with open(path + '.tmp', 'w', encoding='utf-8') as outfile:
+            json.dump(layers, outfile, indent=0)
+        os.replace(path + '.tmp', path)
+    return layers
+
+
+def memory_report(tables: dict[str, pd.DataFrame]) -> dict[str, dict]:
+    """Rows, bytes and bytes per column of every table. Strings are counted with their Python objects."""
+    report = {}
+    for table, df in sorted(tables.items()):
+        column_bytes = df.memory_usage(index=False, deep=True)
+        report[table] = {
+            'rows': len(df),
+            'bytes': int(column_bytes.sum()),
+            'columns': {column: {'dtype': str(df[column].dtype), 'bytes': int(size)}
+                        for column, size in column_bytes.items()},
+        }
+    return report
+
+
+def main():
+    args = parse_args()
+    tables = {}
+    for filename in sorted(os.listdir(args.log_folder)):
+        table, extension = os.path.splitext(filename)
+        if extension == '.arrow':
+            tables[table] = pa.ipc.open_file(os.path.join(args.log_folder, filename)).read_all().to_pandas()
+        elif extension == '.csv' and table not in tables and not os.path.exists(
+                os.path.join(args.log_folder, f'{table}.arrow')):
+            tables[table] = pd.read_csv(os.path.join(args.log_folder, filename))
+    before = memory_report(tables)
+    layers = load_layers(args.log_folder)
+    after = memory_report({table: compact(df, layers) for table, df in tables.items()})
+    for table in before:
+        print(f'{table}: {before[table]["rows"]} rows, {before[table]["bytes"] / 1e6:.1f} MB '
+              f'-> {after[table]["bytes"] / 1e6:.1f} MB')
+        for column, usage in before[table]['columns'].items():
+            compact_usage = after[table]['columns'][column]
+            print(f'    {column}: {usage["dtype"]} {usage["bytes"] / 1e6:.1f} MB '
+                  f'-> {compact_usage["dtype"]} {compact_usage["bytes"] / 1e6:.1f} MB')
+    total_before = sum(usage['bytes'] for usage in before.values())
+    total_after = sum(usage['bytes'] for usage in after.values())
+    print(f'total: {total_before / 1e6:.1f} MB -> {total_after / 1e6:.1f} MB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import os
+
+import pandas as pd
+import pyarrow as pa
+
+from schema import CATEGORICAL_COLUMNS, INTEGER_COLUMNS, LAYER_COLUMNS, compact, load_layers
+
+
+def to_arrow(df: pd.DataFrame, schema: pa.Schema | None = None, layers: list[str] | None = None) -> pa.Table:
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    for column in CATEGORICAL_COLUMNS.intersection(table.column_names):
+        index = table.schema.get_field_index(column)
+        if layers is not None and column in LAYER_COLUMNS:
+            encoded = encode_layers(df[column], layers)
+        else:
+            encoded = table.column(index).cast(pa.string()).dictionary_encode()
+        table = table.set_column(index, column, encoded)
+    for column, dtype in INTEGER_COLUMNS.items():
+        index = table.schema.get_field_index(column)
+        if index >= 0 and pa.types.is_integer(table.schema.field(index).type):
+            table = table.set_column(index, column, table.column(index).cast(dtype))  # raises if a value doesn't fit
+    if schema is not None:
+        table = table.cast(merge_schemas(schema, table.schema))
+    return table
+
+
+def encode_layers(values: pd.Series, layers: list[str]) -> pa.DictionaryArray:
+    """The layers encoded with the whole layer dictionary, see schema.update_layers."""
+    codes = pd.Categorical(values, categories=layers).codes
+    missing = codes < 0
+    if missing.sum() != values.isna().sum():
+        raise ValueError(f'{values.name} has layers that are not in the layer dictionary')
+    indices = pa.array(codes, mask=missing, type=pa.int32())
+    return pa.DictionaryArray.from_arrays(indices, pa.array(layers, pa.string()))
+
+
+def merge_schemas(schema: pa.Schema, other: pa.Schema) -> pa.Schema:
+    """`schema` with its all-null columns (e.g. from an empty first table) typed like in `other`."""
+    fields = [other.field(field.name) if pa.types.is_null(field.type) else field for field in schema]
+    return pa.schema(fields, metadata=schema.metadata)
+
+
+def read_table(path: str) -> pa.Table:
+    """Opens an Arrow IPC file memory-mapped, the columns point into the mapped file instead of being copied."""
+    return pa.ipc.open_file(pa.memory_map(path)).read_all()
+
+
+def load_table(path: str) -> pd.DataFrame:
+    # split_blocks keeps the numeric columns as zero-copy views of the mapped file
+    # the dictionaries of the layer columns are the layer dictionary, the others are in order of appearance and
+    # compact sorts them
+    return compact(read_table(path).to_pandas(split_blocks=True), load_layers(os.path.dirname(path)))
+
+
+def write_table(path: str, df: pd.DataFrame, keep_rows: int | None = None, layers: list[str] | None = None) -> int:
+    """Writes `df` to `path`, or appends it to the first `keep_rows` rows already there.
+    The layer columns are encoded with `layers`, the layer dictionary, if it's given.
+
+    The table is written to a temporary file and renamed over the old one,
+    so readers always see a complete file. Returns the number of rows written.
+    """
+    if keep_rows is None:
+        table = to_arrow(df, layers=layers)
+    else:
+        previous_table = read_table(path).slice(0, keep_rows)
+        new_table = to_arrow(df, previous_table.schema, layers)
+        table = pa.concat_tables([previous_table.cast(new_table.schema), new_table])
+    # the IPC file format needs one dictionary per column for the whole file
+    table = table.combine_chunks()
+    with pa.OSFile(path + '.tmp', 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(path + '.tmp', path)
+    return len(table)
@@ -0,0 +1,20 @@
+import os
+import random
+import sys
+from datetime import datetime, timedelta, timezone
+
+import backfill
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
+from generate_raw_log import generate_rows, write_raw_log  # noqa: E402
+
+
+def test_gap_across_a_chunk_boundary(tmp_path):
+    start = datetime(2023, 1, 1, tzinfo=timezone.utc)
+    boundary = start + timedelta(days=2)  # the first day of the second chunk
+    gap = (boundary - timedelta(hours=3), boundary + timedelta(hours=3))  # the poller was down
+    rows = [(time, row) for time, row in generate_rows(random.Random(3), start, 4, 60, False)
+            if not gap[0] <= time < gap[1]]
+    write_raw_log(str(tmp_path), rows)
+
+    assert backfill.verify(str(tmp_path), workers=2, chunk_days=2)
@@ -0,0 +1,35 @@
+import os
+from inspect import unwrap
+
+import pandas as pd
+
+import dashboard
+import storage
+from datastore import DataStore
+from schema import MATCH_TABLE, update_layers
+
+
+def write_matches(log_folder, layers: list[str], keep_rows: int | None = None):
+    df = pd.DataFrame({
+        'time': pd.date_range('2023-01-01', periods=len(layers), freq='h', tz='UTC'),
+        'previous_layer': layers,
+        'map_name': [layer.split('_')[0] for layer in layers],
+        'version': 'v1',
+        'minutes': 60.0,
+        'mean_player_count': 80.0,
+        'live': True,
+    })
+    storage.write_table(os.path.join(log_folder, f'{MATCH_TABLE}.arrow'), df, keep_rows, update_layers(log_folder, df))
+
+
+def test_match_table_sorts_layers_by_name(tmp_path, monkeypatch):
+    # incremental runs: the layer dictionary is in the order the layers were first seen
+    write_matches(tmp_path, ['Narva_RAAS_v1', 'Gorodok_AAS_v2'])
+    write_matches(tmp_path, ['Belaya_Insurgency_v1', 'Anvil_TC_v1'], keep_rows=2)
+    monkeypatch.setattr(dashboard, 'data_store', DataStore(str(tmp_path), dashboard.read_file))
+
+    for direction, expected in [('asc', ['Anvil_TC_v1', 'Belaya_Insurgency_v1', 'Gorodok_AAS_v2', 'Narva_RAAS_v1']),
+                                ('desc', ['Narva_RAAS_v1', 'Gorodok_AAS_v2', 'Belaya_Insurgency_v1', 'Anvil_TC_v1'])]:
+        rows, _, _ = unwrap(dashboard.update_match_table)(0, 10, [{'column_id': 'layer', 'direction': direction}],
+                                                          None)
+        assert [row['layer'] for row in rows] == expected
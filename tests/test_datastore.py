@@ -0,0 +1,83 @@
+import os
+import threading
+import time
+
+import pandas as pd
+
+from datastore import DataStore
+
+READ_SECONDS = 0.5
+
+
+def write_table(folder, table: str, rows: int):
+    pd.DataFrame({'value': range(rows)}).to_feather(os.path.join(folder, f'{table}.arrow'))
+
+
+class SlowReader:
+    """Reads the slow table in READ_SECONDS and counts the reads of every table."""
+
+    def __init__(self):
+        self.reads = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, path: str, table: str) -> pd.DataFrame:
+        with self.lock:
+            self.reads[table] = self.reads.get(table, 0) + 1
+        if table == 'slow':
+            time.sleep(READ_SECONDS)
+        return pd.read_feather(path)
+
+
+def start(target, *args) -> threading.Thread:
+    thread = threading.Thread(target=target, args=args)
+    thread.start()
+    return thread
+
+
+def test_concurrent_gets_read_a_changed_table_once(tmp_path):
+    write_table(tmp_path, 'slow', 3)
+    read = SlowReader()
+    store = DataStore(str(tmp_path), read)
+    assert len(store.get('slow')) == 3
+    write_table(tmp_path, 'slow', 5)
+
+    results = []
+    threads = [start(lambda: results.append(len(store.get('slow')))) for _ in range(4)]
+    for thread in threads:
+        thread.join()
+
+    assert results == [5] * 4
+    assert read.reads['slow'] == 2
+    assert store.stats()['reloads'] == 1 and store.stats()['hits'] == 3
+
+
+def test_reload_does_not_block_other_tables(tmp_path):
+    write_table(tmp_path, 'slow', 3)
+    write_table(tmp_path, 'fast', 3)
+    store = DataStore(str(tmp_path), SlowReader())
+    store.get('fast')
+
+    thread = start(store.get, 'slow')
+    time.sleep(READ_SECONDS / 5)
+    started = time.monotonic()
+    store.get('fast')
+    write_table(tmp_path, 'fast', 4)
+    assert len(store.get('fast')) == 4
+    assert time.monotonic() - started < READ_SECONDS / 2
+    thread.join()
+
+
+def test_derive_is_cached_per_version(tmp_path):
+    write_table(tmp_path, 'fast', 3)
+    store = DataStore(str(tmp_path), SlowReader())
+    calls = []
+
+    def total(df):
+        calls.append(1)
+        return df['value'].sum()
+
+    assert store.derive('total', ['fast'], total) == 3
+    assert store.derive('total', ['fast'], total) == 3
+    write_table(tmp_path, 'fast', 4)
+    assert store.derive('total', ['fast'], total) == 6
+    assert len(calls) == 2
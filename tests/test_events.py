@@ -0,0 +1,69 @@
+"""The event engine against a frozen corpus: the transitions were recorded with the Python loop
+create_event_log had before events.py, on samples that hit every threshold of every state."""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import process
+from events import detect_events
+
+FIXTURE_FOLDER = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+@pytest.fixture(scope='module')
+def timeline():
+    df = pd.read_csv(os.path.join(FIXTURE_FOLDER, 'event_timeline.csv'))
+    df['time'] = pd.date_range('2023-01-01', periods=len(df), freq='min', tz='UTC')
+    df['seeding'] = df['layer'].str.lower().str.contains('seed', regex=False)
+    return df
+
+
+@pytest.fixture(scope='module')
+def frozen():
+    with open(os.path.join(FIXTURE_FOLDER, 'event_transitions.json'), encoding='utf-8') as infile:
+        frozen = json.load(infile)
+    return [tuple(transition) for transition in frozen['event_log']], frozen['final_state']
+
+
+def test_transitions_match_frozen_corpus(timeline, frozen):
+    event_log, final_state = frozen
+    events, state, next_index = detect_events(timeline['player_count'].values, timeline['seeding'].values)
+    # the loop logged the initial dead state and the unfinished last event too
+    assert [(0, 'dead')] + events + [(len(timeline) - 1, state)] == event_log
+    assert state == final_state
+    assert next_index == len(timeline)
+
+
+def test_event_log_matches_frozen_corpus(timeline, frozen):
+    event_log, _ = frozen
+    event_df = process.create_event_log(timeline)
+    assert event_df['event'].tolist() == [event for _, event in event_log]
+    assert event_df['time'].tolist() == timeline['time'].iloc[[i for i, _ in event_log]].tolist()
+    assert event_df['duration'].iloc[1:].tolist() == (event_df['time'].diff().dt.total_seconds().iloc[1:]).tolist()
+
+
+@pytest.mark.parametrize('split', [1, 2, 3, 7, 9, 15, 18, 23, 500, 1000, 1530])
+def test_resume_from_state_and_index(timeline, frozen, split):
+    player_counts, seeding_layers = timeline['player_count'].values, timeline['seeding'].values
+    first_events, state, next_index = detect_events(player_counts[:split], seeding_layers[:split])
+    assert next_index == split
+    # the later call gets all the samples, but only looks at the ones from next_index on
+    rest_events, final_state, _ = detect_events(player_counts, seeding_layers, state, start=next_index)
+    assert first_events + rest_events == detect_events(player_counts, seeding_layers)[0]
+    assert final_state == frozen[1]
+    assert all(index >= split for index, _ in rest_events)
+
+
+def test_resume_in_small_steps(timeline, frozen):
+    player_counts, seeding_layers = timeline['player_count'].values, timeline['seeding'].values
+    events, state, next_index = [], 'dead', 0
+    rng = np.random.default_rng(1)
+    while next_index < len(timeline):
+        end = min(len(timeline), next_index + int(rng.integers(1, 20)))
+        new_events, state, next_index = detect_events(player_counts[:end], seeding_layers[:end], state,
+                                                      start=next_index)
+        events += new_events
+    assert [(0, 'dead')] + events + [(len(timeline) - 1, state)] == frozen[0]
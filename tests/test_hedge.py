@@ -0,0 +1,34 @@
+import pytest
+
+from hedge import HedgedFetcher
+
+
+def is_valid(result: str) -> bool:
+    return not result.startswith('ERROR')
+
+
+def fail():
+    raise ConnectionError('unreachable')
+
+
+def test_exception_falls_back_to_the_next_source():
+    hedger = HedgedFetcher(delay=5, is_valid=is_valid)
+    assert hedger.fetch('server', {'first': fail, 'second': lambda: 'info'}) == 'info'
+    assert hedger.history.error_rate[('server', 'first')] == 1
+
+
+def test_invalid_answer_is_returned_without_a_valid_one():
+    hedger = HedgedFetcher(delay=5, is_valid=is_valid)
+    assert hedger.fetch('server', {'first': lambda: 'ERROR:timeout', 'second': fail}) == 'ERROR:timeout'
+
+
+def test_exception_is_raised_when_every_source_raises():
+    hedger = HedgedFetcher(delay=5, is_valid=is_valid)
+    with pytest.raises(ConnectionError):
+        hedger.fetch('server', {'first': fail, 'second': fail})
+
+
+def test_server_without_sources():
+    hedger = HedgedFetcher(delay=5, is_valid=is_valid)
+    with pytest.raises(ValueError):
+        hedger.fetch('server', {})
@@ -0,0 +1,106 @@
+"""parse_raw_data against the row by row parser it replaced, kept here as the reference."""
+import logging
+import os
+import random
+import re
+import sys
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import process
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
+from generate_raw_log import generate_rows  # noqa: E402
+
+
+def get_regex_from_data(data: str, pattern: re.Pattern, default: str) -> str:
+    match = pattern.search(data)
+    if match:
+        return match.group(1)
+    return default
+
+
+def parse_battlemetrics_data(d: str):
+    layer = get_regex_from_data(d, re.compile(r'Map;(\w+);'), '')
+    return {
+        'player_count': int(get_regex_from_data(d, re.compile(r'Player count;(\d+)'), '-1')),
+        'layer': layer,
+        'seeding': 'seed' in layer.lower(),
+        'source': 'Battlemetrics'
+    }
+
+
+def scale_to_0_100(num: int) -> int:
+    return max(min(num, 100), 0)
+
+
+def parse_squadservers_data(d: str):
+    layer = get_regex_from_data(d, re.compile(r'Map;;(\w+)'), '')
+    return {
+        'player_count': scale_to_0_100(int(get_regex_from_data(d, re.compile(r'Players;;(\d+)/'), '-1'))),
+        'layer': layer,
+        'seeding': 'seed' in layer.lower(),
+        'source': 'Squad-servers.com'
+    }
+
+
+def process_row(d: str) -> dict:
+    if d.startswith('Rank'):
+        return parse_battlemetrics_data(d)
+    if d.startswith(';;;'):
+        return parse_squadservers_data(d)
+    return {}
+
+
+EDGE_ROWS = [
+    'Rank;#1;Player count;0/100;Map;Narva_RAAS_v1;',
+    'Rank;#1;Player count;100/100;Map;Seed_Logar_v1;',
+    'Rank;#1;Player count;/100;Map;Narva_RAAS_v1;',  # no player count
+    'Rank;#1;Player count;12/100;Map;;',  # no layer
+    'Rank;#1;Player count;12/100;Map;Narva_SEED_v1',  # no ; after the layer
+    ';;;Players;;120/100;;Map;;Sumari_Seed_v1',  # over 100 is clipped
+    ';;;Players;;;;Map;;Sumari_Seed_v1',
+    ';;;Players;;55/100;;Map;;',
+]
+MALFORMED_ROWS = ['garbage', '', ' Rank;#1;Player count;1/100;Map;X_Y_Z;', 'rank;#1', np.nan]
+
+
+def create_corpus(compact: bool) -> pd.Series:
+    rows = [row for _, row in generate_rows(random.Random(7), datetime(2023, 1, 1), 2, 60, compact)
+            if not row.startswith('ERROR')]
+    rows[100:100] = EDGE_ROWS
+    rows[500:500] = MALFORMED_ROWS
+    return pd.Series(rows, index=pd.RangeIndex(10, 10 + len(rows)))
+
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_parse_raw_data_matches_row_parser(compact, caplog):
+    data = create_corpus(compact)
+    with caplog.at_level(logging.WARNING):
+        parsed = process.parse_raw_data(data)
+
+    records = {index: process_row(row) for index, row in data.items() if isinstance(row, str)}
+    expected = pd.DataFrame.from_dict({index: record for index, record in records.items() if record},
+                                      orient='index')
+    pd.testing.assert_frame_equal(parsed, expected, check_dtype=False)
+    assert parsed['player_count'].dtype == np.int64
+    assert parsed['seeding'].dtype == bool
+    # the malformed rows are dropped and reported in one warning
+    assert len(data) - len(parsed) == len(MALFORMED_ROWS)
+    warnings = [record for record in caplog.records if record.levelno == logging.WARNING]
+    assert len(warnings) == 1 and f'Skipped {len(MALFORMED_ROWS)} malformed rows' in warnings[0].getMessage()
+
+
+def test_parse_timeline_skips_failed_queries(caplog):
+    raw_data = pd.DataFrame({
+        'time': ['2023-01-01T00:00:00+00:00', '2023-01-01T00:01:00+00:00', '2023-01-01T00:02:00+00:00'],
+        'data': ['ERROR', 'ERROR:timeout', EDGE_ROWS[0]],
+    })
+    with caplog.at_level(logging.WARNING):
+        timeline = process.parse_timeline(raw_data)
+    assert timeline['player_count'].tolist() == [0]
+    assert timeline['time'].tolist() == [pd.Timestamp('2023-01-01T00:02:00+00:00')]
+    assert not caplog.records  # failed queries are not malformed
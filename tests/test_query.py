@@ -0,0 +1,104 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+import pytest
+
+import query
+import raw_log
+from http_client import HttpClient
+
+SLOW_SECONDS = 1.0
+CYCLE_SECONDS = 0.25
+PAGE = ('<html><body><div class="server-info"><dl>'
+        '<dt>Rank</dt><dd>#12</dd><dt>Player count</dt><dd>80/100</dd><dt>Map</dt><dd>Narva_RAAS_v1</dd>'
+        '<dt>Status</dt><dd>online</dd></dl></div></body></html>')
+
+
+class FakeBattlemetrics(BaseHTTPRequestHandler):
+    """/servers/squad/<id>: `slow` answers after SLOW_SECONDS, `fail` with 500, anything else right away."""
+
+    def do_GET(self):
+        server_id = self.path.rstrip('/').rsplit('/', 1)[-1]
+        if server_id == 'slow':
+            time.sleep(SLOW_SECONDS)
+        if server_id == 'fail':
+            self.send_error(500)
+            return
+        body = PAGE.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def fake_server(monkeypatch):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeBattlemetrics)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = f'http://127.0.0.1:{server.server_address[1]}'
+    monkeypatch.setattr(query, 'BATTLEMETRICS_URL', base_url + '/servers/squad/{server_id}')
+    monkeypatch.setattr(query, 'SQUADSERVERS_URL', base_url + '/server/{server_id}/')
+    yield
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def servers(tmp_path):
+    return [query.Server(name, name, None, str(tmp_path / name)) for name in ('slow', 'fail', 'good')]
+
+
+def read_rows(server: query.Server):
+    return raw_log.read_raw_log(server.folder)[0]
+
+
+def test_one_raw_log_per_server(fake_server, servers, tmp_path):
+    client = HttpClient(connect_timeout=1, read_timeout=5, max_retries=0)
+    in_flight = {}
+    with ThreadPoolExecutor(max_workers=len(servers)) as executor:
+        starttime = time.perf_counter()
+        query.poll(servers, executor, in_flight, client)
+        wait(in_flight.values())
+        cycle_seconds = time.perf_counter() - starttime
+    # the queries run at the same time, a cycle takes about as long as the slowest one
+    assert cycle_seconds < 2 * SLOW_SECONDS
+    assert sorted(os.listdir(tmp_path)) == ['fail', 'good', 'slow']
+    for server in servers:
+        assert os.listdir(server.folder).count(raw_log.RAW_LOG_FOLDER) == 1
+        rows = read_rows(server)
+        assert len(rows) == 1
+        if server.name == 'fail':
+            assert rows['data'].iloc[0].startswith('ERROR')
+        else:
+            assert rows['data'].iloc[0].startswith('Rank;#12;Player count;80/100;Map;Narva_RAAS_v1')
+
+
+def test_slow_server_does_not_delay_the_others(fake_server, servers):
+    client = HttpClient(connect_timeout=1, read_timeout=5, max_retries=0)
+    in_flight = {}
+    cycles = 8
+    with ThreadPoolExecutor(max_workers=len(servers)) as executor:
+        for _ in range(cycles):
+            starttime = time.perf_counter()
+            query.poll(servers, executor, in_flight, client)
+            assert time.perf_counter() - starttime < CYCLE_SECONDS / 2  # poll doesn't wait for the queries
+            time.sleep(CYCLE_SECONDS)
+        wait(in_flight.values())
+    rows = {server.name: read_rows(server) for server in servers}
+    assert len(rows['good']) == cycles
+    assert len(rows['fail']) == cycles
+    assert rows['fail']['data'].str.startswith('ERROR').all()
+    # the slow server is skipped while its query is running, instead of holding up the cycle
+    assert 1 < len(rows['slow']) < cycles
+    # and the good server kept its schedule
+    good_gaps = pd.to_datetime(rows['good']['time']).diff().dt.total_seconds().dropna()
+    assert good_gaps.max() < CYCLE_SECONDS + 0.2
@@ -0,0 +1,66 @@
+import csv
+import os
+
+import pytest
+
+import extract
+import raw_log
+
+FIXTURE_FOLDER = os.path.join(os.path.dirname(__file__), '..', 'benchmarks', 'fixtures')
+
+
+def get_fixture_rows() -> list[str]:
+    """The server info the poller logs for the fixture pages, the Battlemetrics ones span several lines."""
+    rows = []
+    for name in sorted(os.listdir(FIXTURE_FOLDER)):
+        with open(os.path.join(FIXTURE_FOLDER, name), encoding='utf-8') as infile:
+            html = infile.read()
+        extract_function = extract.extract_battlemetrics if name.startswith('battlemetrics') \
+            else extract.extract_squadservers
+        rows.append(extract_function(html).text)
+    return rows
+
+
+def write_legacy_log(log_folder, rows: list[tuple[str, str]]):
+    # like the poller before the partitions
+    with open(os.path.join(log_folder, raw_log.LEGACY_RAW_LOG_FILE), 'a', encoding='utf-8') as outfile:
+        writer = csv.writer(outfile)
+        for row in rows:
+            writer.writerow(row)
+
+
+def test_migrate_keeps_multiline_rows(tmp_path):
+    data = get_fixture_rows()
+    assert any('\n' in text for text in data)
+    times = ['2023-01-01T10:00:00+00:00', '2023-01-01T23:59:00+00:00', '2023-01-02T00:01:00+00:00',
+             '2023-01-01T23:30:00+00:00', '2023-01-03T08:00:00+00:00']  # the clock went back once
+    legacy_rows = [(time, data[i % len(data)]) for i, time in enumerate(times)]
+    write_legacy_log(tmp_path, legacy_rows)
+    raw_log.append_row(str(tmp_path), '2023-01-03T09:00:00+00:00', data[0])  # already written by the poller
+
+    raw_log.migrate(str(tmp_path))
+
+    manifest = raw_log.load_manifest(str(tmp_path))
+    assert [partition['day'] for partition in manifest['partitions']] == ['2023-01-01', '2023-01-02', '2023-01-03']
+    assert sorted(os.listdir(tmp_path / raw_log.RAW_LOG_FOLDER)) == [
+        '2023-01-01.csv.gz', '2023-01-02.csv.gz', '2023-01-03.csv', raw_log.MANIFEST_FILE]
+    df, _ = raw_log.read_raw_log(str(tmp_path))
+    expected = [row for row in legacy_rows if row[0] < '2023-01-02'] + [legacy_rows[2], legacy_rows[4]] \
+        + [('2023-01-03T09:00:00+00:00', data[0])]
+    assert list(zip(df['time'], df['data'])) == expected
+    assert os.path.exists(tmp_path / f'{raw_log.LEGACY_RAW_LOG_FILE}.migrated')
+
+
+def test_failed_migration_changes_nothing(tmp_path):
+    data = get_fixture_rows()
+    write_legacy_log(tmp_path, [('2023-01-01T10:00:00+00:00', data[0]), ('not a time', data[1])])
+    raw_log.append_row(str(tmp_path), '2023-01-01T11:00:00+00:00', data[2])
+    files = sorted(os.listdir(tmp_path / raw_log.RAW_LOG_FOLDER))
+    manifest = raw_log.load_manifest(str(tmp_path))
+
+    with pytest.raises(ValueError):
+        raw_log.migrate(str(tmp_path))
+
+    assert sorted(os.listdir(tmp_path / raw_log.RAW_LOG_FOLDER)) == files
+    assert raw_log.load_manifest(str(tmp_path)) == manifest
+    assert os.path.exists(tmp_path / raw_log.LEGACY_RAW_LOG_FILE)
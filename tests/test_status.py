@@ -0,0 +1,15 @@
+import pandas as pd
+import pytest
+
+import process
+
+
+@pytest.mark.parametrize('player_change_windows, live_in_minutes', [
+    ((15,), 33 / 14 * 15), ((5, 15), 33 / 14 * 15), ((30, 15), 33 / 14 * 15), ((5, 30), None)])
+def test_live_prediction_uses_the_15_minute_window(player_change_windows, live_in_minutes):
+    # seeding with a player a minute: 27 players, up 14 in the last 15 minutes, 33 more to the 60 of live
+    timeline = pd.DataFrame({'time': pd.date_range('2023-01-01', periods=28, freq='min', tz='UTC'),
+                             'player_count': range(0, 28), 'layer': 'Sumari_Seed_v1', 'source': 'battlemetrics'})
+    timeline = process.add_player_change(timeline, player_change_windows)
+    status = process.create_status(timeline, 'seed', player_change_windows)
+    assert status['live_in_minutes'] == pytest.approx(live_in_minutes)
@@ -0,0 +1,52 @@
+import json
+import os
+
+import pandas as pd
+import pytest
+
+import storage
+from schema import LAYERS_FILE, load_layers, update_layers
+
+
+def write(folder, table: str, df: pd.DataFrame, keep_rows: int | None = None) -> str:
+    path = os.path.join(folder, f'{table}.arrow')
+    storage.write_table(path, df, keep_rows, update_layers(folder, df))
+    return path
+
+
+def test_layer_dictionary_is_appended_to_and_shared(tmp_path):
+    timeline_path = write(tmp_path, 'timeline', pd.DataFrame({'layer': ['Narva_RAAS_v1', 'Gorodok_AAS_v2']}))
+    assert load_layers(tmp_path) == ['Gorodok_AAS_v2', 'Narva_RAAS_v1']
+
+    new_rows = pd.DataFrame({'layer': ['Anvil_TC_v1', None, 'Narva_RAAS_v1']})
+    write(tmp_path, 'timeline', new_rows, keep_rows=2)
+    matches = pd.DataFrame({'layer': ['Sumari_Seed_v1'], 'previous_layer': ['Anvil_TC_v1']})
+    match_path = write(tmp_path, 'matches', matches)
+
+    layers = ['Gorodok_AAS_v2', 'Narva_RAAS_v1', 'Anvil_TC_v1', 'Sumari_Seed_v1']
+    with open(os.path.join(tmp_path, LAYERS_FILE), encoding='utf-8') as infile:
+        assert json.load(infile) == layers
+    timeline = storage.load_table(timeline_path)
+    assert timeline['layer'].fillna('Narva_RAAS_v1').tolist() == [
+        'Narva_RAAS_v1', 'Gorodok_AAS_v2', 'Anvil_TC_v1', 'Narva_RAAS_v1', 'Narva_RAAS_v1']
+    assert timeline['layer'].isna().tolist() == [False, False, False, True, False]
+    match_table = storage.load_table(match_path)
+    for values in [timeline['layer'], match_table['layer'], match_table['previous_layer']]:
+        assert values.cat.categories.tolist() == layers
+    assert (match_table['previous_layer'] == timeline['layer'].iloc[2]).all()
+
+
+def test_tables_without_the_dictionary_are_recoded(tmp_path):
+    path = os.path.join(tmp_path, 'timeline.arrow')
+    storage.write_table(path, pd.DataFrame({'layer': ['Narva_RAAS_v1', 'Gorodok_AAS_v2']}))
+    update_layers(tmp_path, pd.DataFrame({'layer': ['Narva_RAAS_v1']}))
+
+    timeline = storage.load_table(path)
+    assert timeline['layer'].cat.categories.tolist() == ['Narva_RAAS_v1', 'Gorodok_AAS_v2']
+    assert timeline['layer'].tolist() == ['Narva_RAAS_v1', 'Gorodok_AAS_v2']
+
+
+def test_layers_missing_from_the_dictionary_are_not_written(tmp_path):
+    with pytest.raises(ValueError):
+        storage.write_table(os.path.join(tmp_path, 'timeline.arrow'), pd.DataFrame({'layer': ['Narva_RAAS_v1']}),
+                            layers=['Gorodok_AAS_v2'])